@@ -0,0 +1,57 @@
+import os
+from typing import Dict, Iterator
+
+import pytest
+from _pytest import fixtures as f
+from _pytest import main as m
+
+from benchmarks import synthetic
+from pytest_psqlgraph import helpers, models
+from pytest_psqlgraph.models import DatabaseDriverConfig
+
+
+def pytest_addoption(parser: m.Parser) -> None:
+    parser.addoption(
+        "--node-types",
+        type=int,
+        default=20,
+        help="number of synthetic node types, models are global so one size is used per session",
+    )
+
+
+@pytest.fixture(scope="session")
+def psqlgraph_config() -> Dict[str, DatabaseDriverConfig]:
+    # benchmarks drive their own fixtures
+    return {}
+
+
+@pytest.fixture(scope="session")
+def schema(request: f.FixtureRequest) -> synthetic.SyntheticSchema:
+    return synthetic.make_schema(request.config.getoption("--node-types"))
+
+
+@pytest.fixture(scope="session")
+def bench_config(schema: synthetic.SyntheticSchema) -> DatabaseDriverConfig:
+    return DatabaseDriverConfig(
+        host=os.getenv("PG_HOST", "localhost"),
+        user=os.getenv("PG_USER", "test"),
+        password=os.getenv("PG_PASS", "test"),
+        database=os.getenv("PG_NAME", "postgres"),
+        model=schema.model,
+        dictionary=schema.dictionary,
+    )
+
+
+@pytest.fixture(scope="session")
+def bench_fixture(bench_config: DatabaseDriverConfig) -> Iterator[helpers.DatabaseFixture]:
+    fixture = helpers.DatabaseFixture("bench", models.DatabaseDriver(bench_config))
+    fixture.pre_config()
+    yield fixture
+    fixture.post_config()
+
+
+@pytest.fixture
+def clean_fixture(bench_fixture: helpers.DatabaseFixture) -> Iterator[helpers.DatabaseFixture]:
+    bench_fixture.clean()
+    yield bench_fixture
+    bench_fixture.clean()
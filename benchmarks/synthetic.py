@@ -0,0 +1,82 @@
+"""Synthetic dictionaries, models and resources of configurable size"""
+import functools
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import attr
+import psqlgml
+from psqlgraph import Edge, Node, pg_property
+
+
+def set_name(self: Node, value: str) -> None:
+    self._set_property("name", value)
+
+
+@attr.s(auto_attribs=True)
+class SyntheticSchema:
+    """A chain of node types, each one linked to the previous one through ``parents``
+
+    Attributes:
+        labels: node labels, in chain order
+        model: module like namespace exposing the psqlgraph ``Node`` class
+        dictionary: dictionary describing the node types
+    """
+
+    labels: List[str]
+    model: Any
+    dictionary: Any
+
+
+@functools.lru_cache(maxsize=None)
+def make_schema(types: int) -> SyntheticSchema:
+    """Declares the models and dictionary of a chain of node types, once per size"""
+    labels = [f"t{types}_{i}" for i in range(types)]
+    schema: Dict[str, Any] = {}
+    classes: Dict[str, type] = {}
+    for i, label in enumerate(labels):
+        links = []
+        edges: Dict[str, Any] = {}
+        if i:
+            parent = labels[i - 1]
+            links.append(
+                dict(name="parents", backref="children", target_type=parent, label="child_of")
+            )
+            edges["parents"] = {"type": classes[parent], "backref": "children"}
+
+        schema[label] = dict(
+            description=f"synthetic node {label}",
+            properties=dict(name=dict(type="string")),
+            links=links,
+        )
+        classes[label] = type(
+            f"T{types}N{i}",
+            (Node,),
+            {"__label__": label, "_pg_edges": edges, "name": pg_property(set_name)},
+        )
+
+    for i in range(1, types):
+        src, dst = classes[labels[i]], classes[labels[i - 1]]
+        type(
+            f"{src.__name__}ParentEdge",
+            (Edge,),
+            {
+                "__src_class__": src.__name__,
+                "__dst_class__": dst.__name__,
+                "__src_dst_assoc__": "parents",
+                "__dst_src_assoc__": "children",
+            },
+        )
+
+    dictionary = type(f"Dictionary{types}", (), {"schema": schema})()
+    return SyntheticSchema(labels=labels, model=SimpleNamespace(Node=Node), dictionary=dictionary)
+
+
+def make_resource(schema: SyntheticSchema, nodes: int) -> psqlgml.GmlData:
+    """A resource with nodes of every type in turn, each linked to the node before it"""
+    types = len(schema.labels)
+    data: Dict[str, Any] = dict(unique_field="node_id", nodes=[], edges=[])
+    for i in range(nodes):
+        data["nodes"].append(dict(label=schema.labels[i % types], node_id=f"n{i}", name=f"n{i}"))
+        if i % types:
+            data["edges"].append(dict(src=f"n{i}", dst=f"n{i - 1}", label="parents"))
+    return data
@@ -0,0 +1,83 @@
+from typing import Any, List
+
+import pytest
+
+from benchmarks import synthetic
+from pytest_psqlgraph import helpers, models
+
+
+def make_factory(fixture: helpers.DatabaseFixture, bulk: bool = False) -> helpers.DataFactory:
+    driver = fixture.driver
+    return helpers.DataFactory(
+        model=driver.model,
+        pg_driver=driver.g,
+        dictionary=driver.dictionary,
+        extension=models.MarkExtension(driver.g),
+        globals=driver.globals,
+        bulk=bulk,
+    )
+
+
+@pytest.mark.parametrize("nodes", [10, 100, 1000])
+def test_validate_resource(benchmark: Any, schema: synthetic.SyntheticSchema, nodes: int) -> None:
+    resource = synthetic.make_resource(schema, nodes)
+    helpers.read_schema(schema.dictionary)
+
+    violations = benchmark(helpers.validate_resource, resource, schema.dictionary)
+    assert not violations
+
+
+@pytest.mark.parametrize("bulk", [False, True], ids=["orm", "bulk"])
+@pytest.mark.parametrize("nodes", [10, 100, 1000])
+def test_from_source(
+    benchmark: Any,
+    schema: synthetic.SyntheticSchema,
+    clean_fixture: helpers.DatabaseFixture,
+    nodes: int,
+    bulk: bool,
+) -> None:
+    resource = synthetic.make_resource(schema, nodes)
+    factory = make_factory(clean_fixture, bulk=bulk)
+
+    def setup() -> None:
+        clean_fixture.clean()
+
+    loaded = benchmark.pedantic(factory.from_source, args=(resource,), setup=setup, rounds=5)
+    assert len(loaded) == nodes
+
+
+@pytest.mark.parametrize("nodes", [10, 100, 1000])
+def test_clean(
+    benchmark: Any,
+    schema: synthetic.SyntheticSchema,
+    clean_fixture: helpers.DatabaseFixture,
+    nodes: int,
+) -> None:
+    resource = synthetic.make_resource(schema, nodes)
+    factory = make_factory(clean_fixture)
+
+    def setup() -> None:
+        factory.from_source(resource)
+
+    benchmark.pedantic(factory.clean, setup=setup, rounds=5)
+
+
+@pytest.mark.parametrize("fanout", [1, 10])
+def test_synthetic_graph(
+    benchmark: Any,
+    schema: synthetic.SyntheticSchema,
+    clean_fixture: helpers.DatabaseFixture,
+    fanout: int,
+) -> None:
+    root, child = schema.labels[:2]
+    spec = [dict(label=root, count=100), dict(label=child, parent=root, fanout=fanout)]
+
+    def setup() -> None:
+        clean_fixture.clean()
+
+    def load() -> List[str]:
+        factory = make_factory(clean_fixture, bulk=True)
+        return factory.stream(helpers.SyntheticSource.create(spec, factory.model, seed=1))
+
+    loaded = benchmark.pedantic(load, setup=setup, rounds=5)
+    assert len(loaded) == 100 * (1 + fanout)
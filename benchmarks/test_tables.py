@@ -0,0 +1,44 @@
+from typing import Any
+
+import attr
+import pytest
+
+from pytest_psqlgraph import helpers, models
+from pytest_psqlgraph.models import DatabaseDriverConfig
+
+
+def test_create_tables(benchmark: Any, bench_fixture: helpers.DatabaseFixture) -> None:
+    driver = bench_fixture.driver
+    benchmark.pedantic(
+        helpers.create_tables, args=(driver,), setup=lambda: helpers.drop_tables(driver), rounds=5
+    )
+
+
+def test_drop_tables(benchmark: Any, bench_fixture: helpers.DatabaseFixture) -> None:
+    driver = bench_fixture.driver
+    benchmark.pedantic(
+        helpers.drop_tables, args=(driver,), setup=lambda: helpers.create_tables(driver), rounds=5
+    )
+    helpers.create_tables(driver)
+
+
+def test_truncate_tables(benchmark: Any, clean_fixture: helpers.DatabaseFixture) -> None:
+    benchmark(helpers.truncate_tables, clean_fixture.driver.g, clean_fixture.tables)
+
+
+@pytest.mark.parametrize("isolation_mode", ["truncate", "rollback"])
+def test_fixture_overhead(
+    benchmark: Any,
+    bench_config: DatabaseDriverConfig,
+    clean_fixture: helpers.DatabaseFixture,
+    isolation_mode: str,
+) -> None:
+    """Cost of isolating a single test from the others"""
+    config = attr.evolve(bench_config, isolation_mode=isolation_mode)
+    fixture = helpers.DatabaseFixture("bench", models.DatabaseDriver(config))
+
+    def run_test() -> None:
+        fixture.pre_test()
+        fixture.post_test()
+
+    benchmark(run_test)
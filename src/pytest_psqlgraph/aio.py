@@ -0,0 +1,183 @@
+""" asyncio counterparts of the driver fixtures, backed by asyncpg """
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import asyncpg
+import attr
+import psqlgml
+from psqlgraph import Node
+from sqlalchemy import Table
+
+from . import helpers, models
+
+logger = logging.getLogger(__name__)
+
+
+def encode_jsonb(value: Any) -> bytes:
+    # binary jsonb values are prefixed with the format version
+    return b"\x01" + json.dumps(value).encode()
+
+
+def decode_jsonb(data: bytes) -> Any:
+    return json.loads(data[1:])
+
+
+async def init_connection(conn: asyncpg.Connection) -> None:
+    """Decodes and encodes jsonb columns, like psqlgraph properties, as python objects
+
+    The binary format is used, as required to copy records.
+    """
+    await conn.set_type_codec(
+        "jsonb",
+        encoder=encode_jsonb,
+        decoder=decode_jsonb,
+        schema="pg_catalog",
+        format="binary",
+    )
+
+
+@attr.s(auto_attribs=True)
+class AsyncDriver:
+    """asyncpg counterpart of a configured psqlgraph driver
+
+    Uses the same database and models as the synchronous driver, whose session fixture creates
+    the tables. Data written by the synchronous driver inside a transaction, like shared mark
+    data in rollback mode, is not visible to it.
+
+    Attributes:
+        fixture: database fixture of the synchronous driver
+        pool: connection pool, bound to the event loop of the test
+        lock_timeout: milliseconds the clean up waits for table locks before failing
+    """
+
+    fixture: helpers.DatabaseFixture
+    pool: asyncpg.pool.Pool
+    lock_timeout: int = 10000
+
+    @classmethod
+    async def connect(cls, fixture: helpers.DatabaseFixture) -> "AsyncDriver":
+        config = fixture.driver.config
+        settings = {}
+        if config.statement_timeout is not None:
+            settings["statement_timeout"] = str(config.statement_timeout)
+        if config.unlogged:
+            settings["synchronous_commit"] = "off"
+        pool = await asyncpg.create_pool(
+            dsn=config.url, min_size=1, init=init_connection, server_settings=settings
+        )
+        return cls(fixture=fixture, pool=pool)
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+    async def truncate_tables(self, tables: Optional[Iterable[str]] = None) -> int:
+        """Truncates tables using a single statement
+
+        Args:
+            tables: names of the tables to truncate, defaults to every table of the driver
+        Returns:
+            number of tables cleaned
+        """
+        names = list(self.fixture.tables if tables is None else tables)
+        if not names:
+            return 0
+
+        await self.pool.execute("truncate {} restart identity cascade".format(", ".join(names)))
+        logger.debug(f"truncated {len(names)} tables")
+        return len(names)
+
+    async def clean(self) -> int:
+        """Removes the rows committed through the pool, called when the fixture is torn down
+
+        While the synchronous driver holds a transaction, for shared mark data or in rollback
+        mode, its locks would block a truncation. Rows are then deleted instead, rows written
+        by that transaction are not visible and stay in place.
+
+        Returns:
+            number of tables cleaned
+        Raises:
+            ValueError: when the tables stay locked for longer than ``lock_timeout``
+        """
+        names = self.fixture.tables
+        try:
+            async with self.pool.acquire() as conn, conn.transaction():
+                await conn.execute(f"set local lock_timeout = {self.lock_timeout}")
+                if self.fixture.transactional or self.fixture.shared.active:
+                    # dependent tables go first
+                    for name in names:
+                        await conn.execute(f"delete from {name}")
+                else:
+                    await conn.execute(
+                        "truncate {} restart identity cascade".format(", ".join(names))
+                    )
+        except asyncpg.LockNotAvailableError as e:
+            raise ValueError(
+                f"tables of {self.fixture.name} are locked by another transaction: {e}"
+            ) from e
+        logger.debug(f"cleaned {len(names)} tables")
+        return len(names)
+
+    async def bulk_insert(self, nodes: Iterable[Node]) -> None:
+        """Writes nodes and their outgoing edges like ``helpers.bulk_insert``, with binary copies
+
+        Args:
+            nodes: nodes to write, edges between them are written once all nodes are
+        """
+        nodes = list(nodes)
+        edges = helpers.outgoing_edges(nodes)
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await self.copy_rows(conn, nodes)
+                await self.copy_rows(conn, edges)
+
+    async def copy_rows(self, conn: asyncpg.Connection, entities: Iterable[Any]) -> None:
+        """Copies nodes or edges, one copy per table and set of columns"""
+        grouped: Dict[Tuple[Table, Tuple[str, ...]], List[Tuple[Any, ...]]] = defaultdict(list)
+        for entity in entities:
+            row = helpers.entity_row(entity)
+            columns = tuple(sorted(row))
+            grouped[(entity.__table__, columns)].append(tuple(row[c] for c in columns))
+
+        for (table, columns), records in grouped.items():
+            await conn.copy_records_to_table(
+                table.name, records=records, columns=columns, schema_name=table.schema
+            )
+            logger.debug(f"copied {len(records)} rows into {table.name}")
+
+    async def load(
+        self,
+        source_data: psqlgml.GmlData,
+        extension: Optional[models.MarkExtension] = None,
+        seed: Optional[int] = None,
+    ) -> List[Node]:
+        """Mocks the nodes described by the source data and writes them
+
+        The nodes are generated like the ones of a ``psqlgraph_data`` mark, the extension hooks
+        are synchronous and run on the event loop.
+
+        Args:
+            source_data: graph description, as found in a data file
+            extension: optional extension hooks, called like for marks
+            seed: seeds the random generator used to mock the nodes
+        Returns:
+            the written nodes
+        """
+        driver = self.fixture.driver
+        factory = helpers.DataFactory(
+            pg_driver=driver.g,
+            model=driver.model,
+            globals=driver.globals,
+            dictionary=driver.dictionary,
+            extension=extension or models.MarkExtension(g=driver.g),
+            bulk=True,
+            seed=seed,
+        )
+        nodes = factory.generate(source_data)
+        factory.extension.pre(nodes)
+        for node in nodes:
+            factory.extension.run(node)
+        await self.bulk_insert(nodes)
+        factory.extension.post(nodes)
+        return nodes
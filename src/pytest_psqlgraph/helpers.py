@@ -1,31 +1,288 @@
 """ Helper functions """
+import copy
+import functools
+import hashlib
+import io
+import json
 import logging
-from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import os
+import random
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+)
 
 import attr
 import psqlgml
-from psqlgraph import Node, PsqlGraphDriver, mocks
+from psqlgraph import Edge, Node, PsqlGraphDriver, mocks
+from psycopg2.extras import execute_values
+from sqlalchemy import Table, create_engine, event, inspect, text
+from sqlalchemy.engine import Connection, Engine, Transaction
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.session import SessionTransaction
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
 
-from pytest_psqlgraph.typings import Literal
+from pytest_psqlgraph.typings import Literal, Protocol
 
 from . import models
 
 logger = logging.getLogger(__name__)
+SCHEMA_MARKER_TABLE: str = "_pytest_psqlgraph_schema"
+BULK_CHUNK_SIZE: int = 1000
+SQL_IDENTIFIER: Pattern[str] = re.compile(r'"(?:[^"]|"")+"|[\w$]+')
+WRITE_STATEMENT: Pattern[str] = re.compile(
+    r"^\s*(?:insert\s+into|update|delete\s+from|copy)\s+"
+    rf"((?:{SQL_IDENTIFIER.pattern})(?:\s*\.\s*(?:{SQL_IDENTIFIER.pattern}))?)",
+    re.IGNORECASE,
+)
+SESSION_KEY: str = "<session>"
+F = TypeVar("F", bound=Callable[..., Any])
+T = TypeVar("T")
 
 
-def truncate_tables(pg_driver: PsqlGraphDriver) -> None:
-    """Truncates all entries in the database
+@attr.s(auto_attribs=True)
+class PhaseStats:
+    calls: int = 0
+    total: float = 0.0
+
+
+@attr.s(auto_attribs=True)
+class ItemStats:
+    duration: float = 0.0
+    statements: int = 0
+
+
+@attr.s(auto_attribs=True)
+class Profiler:
+    """Records the time spent in fixture phases and the SQL statements executed per test
+
+    Attributes:
+        enabled: nothing is recorded unless set
+        phases: time spent per phase, nested phases are also included in their parent
+        items: fixture time and statement count per test node id, work done outside of a
+            test is recorded under ``<session>``
+        current: node id of the running test
+    """
+
+    enabled: bool = False
+    phases: Dict[str, PhaseStats] = attr.ib(factory=lambda: defaultdict(PhaseStats))
+    items: Dict[str, ItemStats] = attr.ib(factory=lambda: defaultdict(ItemStats))
+    current: str = SESSION_KEY
+    _local: threading.local = attr.ib(factory=threading.local)
+    _lock: threading.Lock = attr.ib(factory=threading.Lock)
+
+    @contextmanager
+    def timed(self, phase: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+
+        # phases may run concurrently, nesting is tracked per thread
+        depth = getattr(self._local, "depth", 0)
+        start = time.perf_counter()
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stats = self.phases[phase]
+                stats.calls += 1
+                stats.total += elapsed
+                if not depth:
+                    self.items[self.current].duration += elapsed
+
+    def instrument(self, engine: Engine) -> None:
+        """Counts the statements executed through an engine"""
+        if self.enabled and not event.contains(engine, "before_cursor_execute", self.count):
+            event.listen(engine, "before_cursor_execute", self.count)
+
+    def count(self, *_: Any) -> None:
+        with self._lock:
+            self.items[self.current].statements += 1
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "phases": {name: attr.asdict(stats) for name, stats in self.phases.items()},
+            "tests": {name: attr.asdict(stats) for name, stats in self.items.items()},
+        }
+
+
+PROFILER = Profiler()
+
+
+def profiled(phase: str) -> Callable[[F], F]:
+    """Records the time spent in the decorated function as the given phase"""
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with PROFILER.timed(phase):
+                return func(*args, **kwargs)
+
+        return cast(F, wrapper)
+
+    return decorator
+
+
+def run_concurrently(calls: List[Callable[[], T]], workers: Optional[int] = None) -> List[T]:
+    """Runs independent calls in a pool of threads
+
+    Every call is run even when some of them fail, the first error is raised once all are done
 
     Args:
-        pg_driver: active driver
+        calls: functions to run
+        workers: maximum number of threads, defaults to one per call. With a single worker the
+            calls are run one after the other in the current thread
+    Returns:
+        the results, in the order of the calls
     """
-    with pg_driver.engine.begin() as conn:
-        for table in reversed(pg_driver.engine.table_names()):
+    workers = min(workers or len(calls), len(calls))
+    if workers <= 1:
+        results: List[T] = []
+        errors: List[Exception] = []
+        for call in calls:
             try:
-                conn.execute("delete from {} cascade".format(table))
-                logger.debug(f"truncated {table}")
+                results.append(call())
             except Exception as e:
-                logger.warning(f"error while truncating {table} - {str(e)}", exc_info=True)
+                errors.append(e)
+        if errors:
+            raise errors[0]
+        return results
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(call) for call in calls]
+    return [future.result() for future in futures]
+
+
+def truncate_tables(pg_driver: PsqlGraphDriver, tables: Optional[Iterable[str]] = None) -> int:
+    """Truncates all entries in the database using a single statement
+
+    Args:
+        pg_driver: active driver
+        tables: names of the tables to truncate, defaults to every table in the database
+    Returns:
+        number of tables cleaned
+    """
+    names = list(reversed(pg_driver.engine.table_names()) if tables is None else tables)
+    if not names:
+        return 0
+
+    with pg_driver.engine.begin() as conn:
+        conn.execute("truncate {} restart identity cascade".format(", ".join(names)))
+    logger.debug(f"truncated {len(names)} tables")
+    return len(names)
+
+
+def list_tables(driver: models.DatabaseDriver) -> List[str]:
+    """Lists the names of all tables managed by a driver, dependent tables first"""
+    names: List[str] = []
+    for base in [driver.orm_base, *driver.extra_bases]:
+        for table in reversed(base.metadata.sorted_tables):
+            if table.fullname not in names:
+                names.append(table.fullname)
+    return names
+
+
+def written_table(statement: str) -> Optional[str]:
+    """Name of the table written by a textual statement, None for other statements
+
+    Quoted identifiers that do not need quoting are unquoted, unquoted ones are folded to
+    lower case like postgres does, so the name can be used in a ``TRUNCATE`` statement.
+    """
+    match = WRITE_STATEMENT.match(statement)
+    if not match:
+        return None
+
+    parts = []
+    for identifier in SQL_IDENTIFIER.findall(match.group(1)):
+        if not identifier.startswith('"'):
+            parts.append(identifier.lower())
+        elif re.fullmatch(r"[a-z_][a-z0-9_$]*", identifier[1:-1]):
+            parts.append(identifier[1:-1])
+        else:
+            parts.append(identifier)
+    return ".".join(parts)
+
+
+@attr.s(auto_attribs=True, eq=False)
+class WriteTracker:
+    """Records the names of tables written through an engine
+
+    Inserts, updates and deletes issued through the ORM or the expression language are
+    resolved from the statement, textual statements are matched against ``WRITE_STATEMENT``.
+    Rows written with the DBAPI cursor, like bulk inserts, are reported by :func:`record_writes`.
+    """
+
+    engine: Engine
+    tables: Set[str] = attr.ib(factory=set)
+
+    def __attrs_post_init__(self) -> None:
+        self.open()
+
+    def open(self) -> None:
+        """Starts tracking the writes made through the engine, unless already tracking them"""
+        if not event.contains(self.engine, "before_execute", self.receive_before_execute):
+            event.listen(self.engine, "before_execute", self.receive_before_execute)
+            WRITE_TRACKERS[self.engine].append(self)
+
+    def close(self) -> None:
+        """Stops tracking writes, engines are shared by drivers and outlive the tracker"""
+        if event.contains(self.engine, "before_execute", self.receive_before_execute):
+            event.remove(self.engine, "before_execute", self.receive_before_execute)
+        trackers = WRITE_TRACKERS.get(self.engine, [])
+        if self in trackers:
+            trackers.remove(self)
+        if not trackers:
+            WRITE_TRACKERS.pop(self.engine, None)
+
+    def receive_before_execute(self, conn: Connection, clauseelement: Any, *args: Any) -> None:
+        if isinstance(clauseelement, UpdateBase):
+            self.tables.add(clauseelement.table.fullname)
+            return
+
+        statement = clauseelement.text if isinstance(clauseelement, TextClause) else clauseelement
+        if isinstance(statement, str):
+            table = written_table(statement)
+            if table:
+                self.tables.add(table)
+
+    def flush(self) -> Set[str]:
+        """Returns the tables written so far and resets the tracker"""
+        tables, self.tables = self.tables, set()
+        return tables
+
+
+WRITE_TRACKERS: Dict[Engine, List[WriteTracker]] = defaultdict(list)
+
+
+def record_writes(conn: Connection, tables: Iterable[str]) -> None:
+    """Records tables written with the DBAPI cursor of a connection, out of sight of trackers"""
+    for tracker in WRITE_TRACKERS.get(conn.engine, []):
+        tracker.tables.update(tables)
 
 
 def create_tables(driver: models.DatabaseDriver) -> None:
@@ -37,6 +294,12 @@ def create_tables(driver: models.DatabaseDriver) -> None:
     for extra in driver.extra_bases:
         extra.metadata.create_all(driver.g.engine)
 
+    if driver.unlogged:
+        # tables referenced by logged tables can not be unlogged, dependent tables go first
+        with driver.g.engine.begin() as conn:
+            for table in list_tables(driver):
+                conn.execute(f"alter table {table} set unlogged")
+
 
 def drop_tables(driver: models.DatabaseDriver) -> None:
     """Drops all tables in the listed orm_bases"""
@@ -47,28 +310,934 @@ def drop_tables(driver: models.DatabaseDriver) -> None:
         base.metadata.drop_all(driver.g.engine)
 
 
+def schema_fingerprint(driver: models.DatabaseDriver) -> str:
+    """Computes a hash of the tables, columns, foreign keys and indexes managed by a driver"""
+    digest = hashlib.sha256()
+    tables = {}
+    for base in [driver.orm_base, *driver.extra_bases]:
+        tables.update(base.metadata.tables)
+
+    for name in sorted(tables):
+        table = tables[name]
+        digest.update(f"table:{name}".encode())
+        for column in table.columns:
+            foreign_keys = sorted(fk.target_fullname for fk in column.foreign_keys)
+            digest.update(
+                f"column:{column.name}:{column.type!r}:{column.nullable}:{column.primary_key}:"
+                f"{foreign_keys}".encode()
+            )
+        for index in sorted(table.indexes, key=lambda i: str(i.name)):
+            columns = [str(c) for c in index.expressions]
+            digest.update(f"index:{index.name}:{columns}:{index.unique}".encode())
+    if driver.unlogged:
+        digest.update(b"unlogged")
+    return digest.hexdigest()
+
+
+def stored_fingerprint(pg_driver: PsqlGraphDriver, name: str) -> Optional[str]:
+    """Reads the schema fingerprint recorded for a driver, None if there is none"""
+    with pg_driver.engine.begin() as conn:
+        conn.execute(
+            f"create table if not exists {SCHEMA_MARKER_TABLE} "
+            "(name text primary key, fingerprint text not null)"
+        )
+        return conn.execute(
+            text(f"select fingerprint from {SCHEMA_MARKER_TABLE} where name = :name"), name=name
+        ).scalar()
+
+
+def store_fingerprint(pg_driver: PsqlGraphDriver, name: str, fingerprint: str) -> None:
+    with pg_driver.engine.begin() as conn:
+        conn.execute(text(f"delete from {SCHEMA_MARKER_TABLE} where name = :name"), name=name)
+        conn.execute(
+            text(f"insert into {SCHEMA_MARKER_TABLE} values (:name, :fingerprint)"),
+            name=name,
+            fingerprint=fingerprint,
+        )
+
+
+@attr.s(auto_attribs=True)
+class TransactionScope:
+    """Binds all sessions of a driver to a single connection whose changes are rolled back
+
+    The connection holds an outer transaction and a stack of savepoints, sessions created by
+    the driver while the scope is active join the innermost savepoint, so commits made by the
+    code under test are never persisted. A session rolling back also rolls back the savepoint
+    it joined, the savepoint is then opened again, following the sqlalchemy recipe for joining
+    a session into an external transaction.
+    """
+
+    pg_driver: PsqlGraphDriver
+    engine: Optional[Engine] = None
+    connection: Optional[Connection] = None
+    transaction: Optional[Transaction] = None
+    savepoints: List[Transaction] = attr.ib(factory=list)
+
+    @property
+    def active(self) -> bool:
+        return self.connection is not None
+
+    def begin(self) -> None:
+        self.engine = self.pg_driver.engine
+        self.connection = self.engine.connect()
+        self.transaction = self.connection.begin()
+        self.begin_nested()
+        JOINED_SCOPES[self.connection] = self
+        # psqlgraph binds every new session to the current value of its engine attribute
+        self.pg_driver.engine = self.connection
+
+    def begin_nested(self) -> int:
+        """Opens a new savepoint on the scope connection
+
+        Returns:
+            the depth of the savepoint, used to roll it back
+        """
+        if self.connection is None:
+            raise ValueError("transaction scope is not active")
+        self.savepoints.append(self.connection.begin_nested())
+        return len(self.savepoints) - 1
+
+    def rollback_nested(self, depth: int) -> None:
+        """Rolls back a savepoint, along with the savepoints opened after it"""
+        if depth >= len(self.savepoints):
+            return
+        savepoint = self.savepoints[depth]
+        del self.savepoints[depth:]
+        if savepoint.is_active:
+            savepoint.rollback()
+
+    def restart_savepoints(self) -> None:
+        """Opens again the savepoints rolled back by a session"""
+        if self.connection is None or self.transaction is None or not self.transaction.is_active:
+            return
+        for depth, savepoint in enumerate(self.savepoints):
+            if not savepoint.is_active:
+                # the savepoints opened after it are gone as well
+                del self.savepoints[depth:]
+                self.begin_nested()
+                return
+
+    def rollback(self) -> None:
+        connection, transaction = self.connection, self.transaction
+        if connection is None or transaction is None:
+            return
+
+        self.pg_driver.engine = self.engine
+        JOINED_SCOPES.pop(connection, None)
+        try:
+            self.rollback_nested(0)
+            transaction.rollback()
+        finally:
+            connection.close()
+            self.engine = self.connection = self.transaction = None
+            self.savepoints = []
+
+
+JOINED_SCOPES: Dict[Connection, TransactionScope] = {}
+
+
+@event.listens_for(Session, "after_transaction_end")
+def restart_savepoints(session: Session, transaction: SessionTransaction) -> None:
+    """Restarts the savepoints of a transaction scope once a session joining it ends"""
+    if transaction.parent is None:
+        scope = JOINED_SCOPES.get(session.bind)
+        if scope is not None:
+            scope.restart_savepoints()
+
+
+@attr.s(auto_attribs=True)
+class WorkerDatabase:
+    """A database dedicated to a single pytest-xdist worker
+
+    The schema is created once per test run in a template database, by whichever worker gets
+    there first, every worker then clones it into ``<database>_<worker_id>``. The last worker
+    to finish drops the template. Workers coordinate through an advisory lock taken on the
+    configured database.
+
+    Attributes:
+        base: configuration pointing at the configured (maintenance) database
+        worker_id: xdist worker id, e.g. gw0
+        run_id: id shared by all workers of the same test run
+    """
+
+    base: models.DatabaseDriverConfig
+    worker_id: str
+    run_id: str
+
+    @property
+    def template(self) -> str:
+        return f"{self.base.database}_tmpl"
+
+    @property
+    def database(self) -> str:
+        return f"{self.base.database}_{self.worker_id}"
+
+    @property
+    def config(self) -> models.DatabaseDriverConfig:
+        """configuration pointing at the worker database"""
+        return attr.evolve(self.base, database=self.database)
+
+    def _execute(self, conn: Connection, statement: str, **params: Any) -> Any:
+        return conn.execute(text(statement), **params)
+
+    def _locked(self, callback: Any) -> None:
+        engine = create_engine(self.base.url, isolation_level="AUTOCOMMIT")
+        try:
+            with engine.connect() as conn:
+                self._execute(
+                    conn, "select pg_advisory_lock(hashtext(:name))", name=self.template
+                )
+                try:
+                    callback(conn)
+                finally:
+                    self._execute(
+                        conn, "select pg_advisory_unlock(hashtext(:name))", name=self.template
+                    )
+        finally:
+            engine.dispose()
+
+    def _template_run_id(self, conn: Connection) -> Optional[str]:
+        return self._execute(
+            conn,
+            "select shobj_description(oid, 'pg_database') from pg_database where datname = :name",
+            name=self.template,
+        ).scalar()
+
+    def _create_template(self, conn: Connection) -> None:
+        logger.debug(f"creating template database {self.template}")
+        self._execute(conn, f'drop database if exists "{self.template}"')
+        self._execute(conn, f'create database "{self.template}"')
+
+        driver = models.DatabaseDriver(attr.evolve(self.base, database=self.template))
+        try:
+            create_tables(driver)
+        finally:
+            driver.g.engine.dispose()
+        self._execute(conn, f"comment on database \"{self.template}\" is '{self.run_id}'")
+
+    def _provision(self, conn: Connection) -> None:
+        if self._template_run_id(conn) != self.run_id:
+            self._create_template(conn)
+
+        logger.debug(f"creating worker database {self.database}")
+        self._execute(conn, f'drop database if exists "{self.database}"')
+        self._execute(conn, f'create database "{self.database}" template "{self.template}"')
+
+    def _destroy(self, conn: Connection) -> None:
+        logger.debug(f"dropping worker database {self.database}")
+        # connections leaked by tests would otherwise block the drop
+        self._execute(
+            conn,
+            "select pg_terminate_backend(pid) from pg_stat_activity "
+            "where datname = :name and pid <> pg_backend_pid()",
+            name=self.database,
+        )
+        self._execute(conn, f'drop database if exists "{self.database}"')
+
+        prefix = f"{self.base.database}_gw"
+        remaining = self._execute(
+            conn,
+            "select count(*) from pg_database where left(datname, :size) = :prefix",
+            size=len(prefix),
+            prefix=prefix,
+        ).scalar()
+        if not remaining:
+            self._execute(conn, f'drop database if exists "{self.template}"')
+
+    def provision(self) -> None:
+        self._locked(self._provision)
+
+    def destroy(self) -> None:
+        self._locked(self._destroy)
+
+
+@attr.s(auto_attribs=True)
+class SharedData:
+    """Nodes loaded once and shared by all tests of a module or session
+
+    Attributes:
+        nodes: the loaded nodes
+        module: True when loaded after the module savepoint, the data is then rolled back
+            with the module
+    """
+
+    nodes: List[Any]
+    module: bool
+
+
 @attr.s(auto_attribs=True)
 class DatabaseFixture:
     name: str
     driver: models.DatabaseDriver
     volatile: bool = False
+    worker: Optional[WorkerDatabase] = None
+    scope: TransactionScope = attr.ib(init=False)
+    shared: TransactionScope = attr.ib(init=False)
+    shared_data: Dict[Tuple[str, str], SharedData] = attr.ib(init=False, factory=dict)
+    module_id: Optional[str] = attr.ib(init=False, default=None)
+    module_savepoint: Optional[int] = attr.ib(init=False, default=None)
+    test_savepoint: Optional[int] = attr.ib(init=False, default=None)
+    snapshots: Dict[str, "Snapshot"] = attr.ib(init=False, factory=dict)
+    tracker: Optional[WriteTracker] = attr.ib(init=False, default=None)
+    tables_cleaned: int = attr.ib(init=False, default=0)
+    in_test: bool = attr.ib(init=False, default=False)
+    dirty: bool = attr.ib(init=False, default=False)
+    _tables: List[str] = attr.ib(init=False, factory=list)
+    _fingerprint: str = attr.ib(init=False, default="")
+    _schema_size: int = attr.ib(init=False, default=-1)
+
+    def __attrs_post_init__(self) -> None:
+        self.scope = TransactionScope(self.driver.g)
+        self.shared = TransactionScope(self.driver.g)
+
+    def _refresh_schema(self) -> None:
+        size = sum(
+            len(base.metadata.tables) for base in [self.driver.orm_base, *self.driver.extra_bases]
+        )
+        if size != self._schema_size:
+            self._tables = list_tables(self.driver)
+            self._fingerprint = schema_fingerprint(self.driver)
+            self._schema_size = size
+
+    @property
+    def tables(self) -> List[str]:
+        """Ordered names of the driver tables, recomputed only when models are added"""
+        self._refresh_schema()
+        return self._tables
+
+    @property
+    def fingerprint(self) -> str:
+        """Schema fingerprint of the driver models, recomputed only when models are added"""
+        self._refresh_schema()
+        return self._fingerprint
+
+    @property
+    def transactional(self) -> bool:
+        return self.driver.isolation_mode == "rollback"
 
+    @profiled("truncate")
+    def clean(self) -> int:
+        if self.tracker:
+            return truncate_tables(self.driver.g, sorted(self.tracker.flush()))
+        return truncate_tables(self.driver.g, self.tables)
+
+    @profiled("pre_test")
     def pre_test(self) -> PsqlGraphDriver:
         logger.debug("Running pre test setup for {}".format(self.name))
-        truncate_tables(self.driver.g)
+        self.tables_cleaned = 0
+        if self.shared.active:
+            # shared data is kept, only the changes made by this test are rolled back
+            self.test_savepoint = self.shared.begin_nested()
+        elif self.transactional:
+            self.scope.begin()
+        else:
+            self.tables_cleaned += self.clean()
+        self.in_test = True
         return self.driver.g
 
-    def post_test(self) -> None:
+    @profiled("post_test")
+    def post_test(self, defer_clean: bool = False) -> None:
+        """Ends the isolation of a test
+
+        Args:
+            defer_clean: leave truncating the tables to ``finish_test``, so that the drivers of
+                a test can be cleaned up together
+        """
         logger.debug("Running post test clean up for {}".format(self.name))
-        truncate_tables(self.driver.g)
+        self.in_test = False
+        if self.test_savepoint is not None:
+            self.shared.rollback_nested(self.test_savepoint)
+            self.test_savepoint = None
+        elif self.transactional:
+            self.scope.rollback()
+        elif defer_clean:
+            self.dirty = True
+            return
+        else:
+            self.tables_cleaned += self.clean()
+        logger.debug(f"{self.tables_cleaned} tables cleaned for {self.name}")
+
+    @profiled("post_test")
+    def finish_test(self) -> None:
+        """Truncates the tables left by a deferred ``post_test``"""
+        if self.dirty:
+            self.dirty = False
+            self.tables_cleaned += self.clean()
+            logger.debug(f"{self.tables_cleaned} tables cleaned for {self.name}")
 
+    @profiled("pre_config")
     def pre_config(self) -> None:
         logger.debug("Setting up database for {}".format(self.name))
-        create_tables(self.driver)
+        if self.worker:
+            # schema is cloned from the template database
+            self.worker.provision()
+        elif self.driver.reuse_schema:
+            self.reuse_or_create_tables()
+        else:
+            create_tables(self.driver)
+        self._schema_size = -1
+        if self.driver.track_writes and not self.transactional:
+            # tables may pre-date the session, start from a clean slate
+            truncate_tables(self.driver.g, self.tables)
+            if self.tracker is None:
+                self.tracker = WriteTracker(self.driver.g.engine)
+            else:
+                self.tracker.flush()
+                self.tracker.open()
+
+    def close(self) -> None:
+        """Rolls back the open transactions and stops tracking writes, the tables are kept"""
+        self.end_session()
+        self.scope.rollback()
+        if self.tracker:
+            self.tracker.close()
 
+    @profiled("post_config")
     def post_config(self) -> None:
         logger.debug("Destroying database for {}".format(self.name))
+        self.close()
+        if self.worker:
+            self.driver.g.engine.dispose()
+            self.worker.destroy()
+        elif not self.driver.reuse_schema:
+            drop_tables(self.driver)
+
+    def load_shared(
+        self, key: str, module_id: Optional[str], loader: Callable[[], List[Any]]
+    ) -> List[Any]:
+        """Loads data shared by multiple tests, only the first call for a key runs the loader
+
+        Shared data lives in a transaction that is rolled back at the end of its scope, tests
+        running while the transaction is open are isolated with savepoints.
+
+        Args:
+            key: identifies the loaded data
+            module_id: name of the module sharing the data, None when shared by the session
+            loader: writes the data using the driver
+        Returns:
+            the loaded nodes
+        """
+        cache_key = (module_id or "", key)
+        if cache_key in self.shared_data:
+            return self.shared_data[cache_key].nodes
+
+        if self.in_test:
+            raise ValueError(f"shared data must be loaded before {self.name} is set up")
+
+        if not self.shared.active:
+            self.shared.begin()
+        if module_id and module_id != self.module_id:
+            self.end_module()
+            if not self.shared.active:
+                self.shared.begin()
+            self.module_savepoint = self.shared.begin_nested()
+            self.module_id = module_id
+
+        logger.debug(f"loading shared data {key} for {self.name}")
+        nodes = loader()
+        self.shared_data[cache_key] = SharedData(nodes, module=self.module_id is not None)
+        return nodes
+
+    def select_shared(self, keys: Set[Tuple[str, str]]) -> None:
+        """Rolls back the shared data a test does not use
+
+        Shared data is only visible to the tests carrying its mark, it is loaded again by the
+        next test using it.
+
+        Args:
+            keys: module name, or an empty string for session data, and key of the shared data
+                used by the test
+        """
+        unused = [key for key in self.shared_data if key not in keys]
+        if unused and all(self.shared_data[key].module for key in unused):
+            self.end_module()
+        if not self.shared_data or any(key not in keys for key in self.shared_data):
+            self.end_session()
+
+    def end_module(self) -> None:
+        """Rolls back module scoped data, and session data loaded after it"""
+        if self.module_savepoint is None:
+            return
+
+        self.shared.rollback_nested(self.module_savepoint)
+        self.module_id = self.module_savepoint = None
+        self.shared_data = {k: v for k, v in self.shared_data.items() if not v.module}
+        if not self.shared_data:
+            self.end_session()
+
+    def end_session(self) -> None:
+        """Rolls back all shared data"""
+        self.shared.rollback()
+        self.shared_data.clear()
+        self.module_id = self.module_savepoint = None
+
+    def load_snapshot(self, key: str, loader: Callable[[], List[Node]]) -> List[Node]:
+        """Restores a previously loaded dataset from its snapshot, or loads and snapshots it
+
+        Args:
+            key: identifies the dataset, combined with the schema fingerprint
+            loader: writes the dataset using the driver
+        Returns:
+            the dataset nodes, restored nodes are transient copies of the loaded ones
+        """
+        key = f"{key}:{self.fingerprint}"
+        snapshot = self.snapshots.get(key)
+        if snapshot:
+            logger.debug(f"restoring snapshot {key} for {self.name}")
+            restore_rows(self.driver.g, snapshot.tables)
+            if self.tracker:
+                # rows are copied with the raw cursor, out of sight of the tracker
+                self.tracker.tables.update(table for table, _ in snapshot.tables)
+            return snapshot.template.create()
+
+        nodes = loader()
+        self.snapshots[key] = Snapshot(
+            template=GraphTemplate.from_nodes(nodes), tables=copy_rows(self.driver.g, nodes)
+        )
+        return nodes
+
+    def reuse_or_create_tables(self) -> None:
+        """Keeps the existing schema if it matches the models, recreates it otherwise"""
+        fingerprint = schema_fingerprint(self.driver)
+        if stored_fingerprint(self.driver.g, self.name) == fingerprint:
+            logger.debug(f"reusing existing schema for {self.name}")
+            truncate_tables(self.driver.g, self.tables)
+            return
+
+        logger.debug(f"schema changed, recreating tables for {self.name}")
         drop_tables(self.driver)
+        create_tables(self.driver)
+        store_fingerprint(self.driver.g, self.name, fingerprint)
+
+
+def entity_row(entity: Union[Node, Edge]) -> Dict[str, Any]:
+    """Column values of a node or edge, unset columns are left to their server defaults"""
+    row: Dict[str, Any] = {}
+    for prop in inspect(entity).mapper.column_attrs:
+        value = getattr(entity, prop.key)
+        if value is not None:
+            row[prop.columns[0].name] = value
+    return row
+
+
+def bulk_insert(session: Any, nodes: Iterable[Node], chunk_size: int = BULK_CHUNK_SIZE) -> None:
+    """Writes nodes and their outgoing edges with multi row inserts grouped by table
+
+    This bypasses the ORM unit of work, so psqlgraph session hooks are not executed
+
+    Args:
+        session: session used to write the entries
+        nodes: nodes to write, edges between them are written once all nodes are
+        chunk_size: maximum number of rows per insert statement
+    """
+    nodes = list(nodes)
+    edges = outgoing_edges(nodes)
+    insert_rows(session, nodes, chunk_size)
+    insert_rows(session, edges, chunk_size)
+
+
+def outgoing_edges(nodes: Iterable[Node]) -> List[Edge]:
+    """Validates nodes written outside the ORM unit of work and collects their outgoing edges
+
+    Args:
+        nodes: nodes about to be written
+    Returns:
+        the outgoing edges, with their source and destination ids set
+    """
+    edges: List[Edge] = []
+    for node in nodes:
+        node._validate()
+        for edge in node.edges_out:
+            # normally synced from the relationships during flush
+            edge.src_id, edge.dst_id = edge.src.node_id, edge.dst.node_id
+            edges.append(edge)
+    return edges
+
+
+def insert_rows(
+    session: Any, entities: Iterable[Union[Node, Edge]], chunk_size: int = BULK_CHUNK_SIZE
+) -> None:
+    """Writes nodes or edges with multi row inserts, one per table and set of columns"""
+    grouped: Dict[Tuple[Table, FrozenSet[str]], List[Dict[str, Any]]] = defaultdict(list)
+    for entity in entities:
+        row = entity_row(entity)
+        grouped[(entity.__table__, frozenset(row))].append(row)
+
+    for (table, _), rows in grouped.items():
+        insert_table_rows(session, table, rows, chunk_size)
+
+
+def insert_table_rows(
+    session: Any, table: Table, rows: List[Dict[str, Any]], chunk_size: int = BULK_CHUNK_SIZE
+) -> None:
+    """Writes rows with the same columns with multi row inserts
+
+    Rows are sent with psycopg2's ``execute_values`` on the cursor of the session connection,
+    column values are converted by the column types like sqlalchemy does.
+    """
+    if not rows:
+        return
+
+    conn = session.connection()
+    preparer = conn.dialect.identifier_preparer
+    columns = [table.c[name] for name in rows[0]]
+    processors = [column.type.bind_processor(conn.dialect) for column in columns]
+    values = [
+        tuple(
+            process(row[column.name]) if process else row[column.name]
+            for column, process in zip(columns, processors)
+        )
+        for row in rows
+    ]
+    statement = "insert into {} ({}) values %s".format(
+        preparer.format_table(table), ", ".join(preparer.quote(c.name) for c in columns)
+    )
+    execute_values(conn.connection.cursor(), statement, values, page_size=chunk_size)
+    record_writes(conn, [table.fullname])
+    logger.debug(f"bulk inserted {len(rows)} rows into {table.name}")
+
+
+def graph_tables(nodes: Iterable[Node]) -> List[Table]:
+    """Tables written along with nodes, the node tables and the tables of their outgoing edges"""
+    tables: Dict[str, Table] = {}
+    for node in nodes:
+        tables.setdefault(node.__table__.fullname, node.__table__)
+        for edge in loaded_edges_out(node):
+            tables.setdefault(edge.__table__.fullname, edge.__table__)
+    return list(tables.values())
+
+
+def label_tables(model: models.DataModel, labels: Iterable[str]) -> List[Table]:
+    """Tables written along with nodes of the given labels, including the edges between them"""
+    node_base = cast(Any, model).Node
+    classes = {node_base.get_subclass(label): None for label in labels}
+    names = {cls.__name__ for cls in classes}
+    tables = [cls.__table__ for cls in classes]
+    for edge_cls in Edge.get_subclasses():
+        if edge_cls.__src_class__ in names and edge_cls.__dst_class__ in names:
+            tables.append(edge_cls.__table__)
+    return tables
+
+
+@contextmanager
+def deferred_indexes(conn: Connection, tables: Iterable[Table]) -> Iterator[None]:
+    """Drops the non unique indexes of tables while loading data and rebuilds them afterwards
+
+    Checks of the deferrable foreign keys of the tables, like the ones of psqlgraph edges, are
+    deferred until the data is loaded, then set back to their declared mode for the rest of the
+    transaction. The indexes are dropped in the transaction of the connection, they are restored
+    by a rollback when the load fails.
+    """
+    tables = list(tables)
+    indexes = [index for table in tables for index in table.indexes if not index.unique]
+    constraints = deferrable_foreign_keys(conn, tables)
+    if constraints:
+        conn.execute(f"set constraints {', '.join(constraints)} deferred")
+    for index in indexes:
+        schema = f"{index.table.schema}." if index.table.schema else ""
+        conn.execute(f"drop index if exists {schema}{index.name}")
+    yield
+    # indexes can not be built while foreign key checks are pending
+    if constraints:
+        conn.execute(f"set constraints {', '.join(constraints)} immediate")
+    for index in indexes:
+        index.create(bind=conn)
+    logger.debug(f"rebuilt {len(indexes)} indexes")
+
+    initially_deferred = [name for name, deferred in constraints.items() if deferred]
+    if initially_deferred:
+        conn.execute(f"set constraints {', '.join(initially_deferred)} deferred")
+
+
+def deferrable_foreign_keys(conn: Connection, tables: List[Table]) -> Dict[str, bool]:
+    """Qualified names of the deferrable foreign keys of tables, with their initially deferred flag
+
+    The names are looked up in the catalog, psqlgraph leaves them to the server.
+    """
+    names = [f"{table.schema}.{table.name}" if table.schema else table.name for table in tables]
+    rows = conn.execute(
+        text(
+            "select quote_ident(n.nspname) || '.' || quote_ident(c.conname), c.condeferred "
+            "from pg_constraint c join pg_namespace n on n.oid = c.connamespace "
+            "where c.contype = 'f' and c.condeferrable "
+            "and c.conrelid = any(cast(:tables as regclass[])) order by 1"
+        ),
+        tables=names,
+    )
+    return {name: deferred for name, deferred in rows}
+
+
+def seeded_node_id() -> str:
+    """A node id drawn from the global random generator, psqlgraph defaults to unseeded uuid4"""
+    return str(uuid.UUID(int=random.getrandbits(128), version=4))
+
+
+@contextmanager
+def seeded(seed: Optional[int]) -> Iterator[None]:
+    """Seeds the global random generator used by psqlgraph mocks, restoring its state on exit"""
+    if seed is None:
+        yield
+        return
+
+    state = random.getstate()
+    random.seed(seed)
+    try:
+        yield
+    finally:
+        random.setstate(state)
+
+
+def loaded_edges_out(node: Node) -> List[Edge]:
+    """Outgoing edges already loaded on a node, detached nodes can not lazy load the others"""
+    unloaded = inspect(node).unloaded
+    return [edge for rel in node._edges_out if rel not in unloaded for edge in getattr(node, rel)]
+
+
+@attr.s(auto_attribs=True)
+class GraphTemplate:
+    """Plain data copy of a generated mock graph, used to create new instances of the graph
+
+    Attributes:
+        nodes: node class and constructor arguments pairs
+        edges: source node id, association name and destination node id
+    """
+
+    nodes: List[Tuple[Type[Node], Dict[str, Any]]] = attr.ib(factory=list)
+    edges: List[Tuple[str, str, str]] = attr.ib(factory=list)
+
+    @classmethod
+    def from_nodes(cls, nodes: Iterable[Node]) -> "GraphTemplate":
+        template = cls()
+        for node in nodes:
+            values = dict(
+                node_id=node.node_id,
+                acl=list(node.acl),
+                properties=copy.deepcopy(node._props),
+                system_annotations=copy.deepcopy(node._sysan),
+            )
+            template.nodes.append((type(node), values))
+            for edge in loaded_edges_out(node):
+                template.edges.append((node.node_id, edge.__src_dst_assoc__, edge.dst.node_id))
+        return template
+
+    def create(self) -> List[Node]:
+        nodes: Dict[str, Node] = {}
+        for node_cls, values in self.nodes:
+            nodes[values["node_id"]] = node_cls(**copy.deepcopy(values))
+        for src_id, association, dst_id in self.edges:
+            getattr(nodes[src_id], association).append(nodes[dst_id])
+        return list(nodes.values())
+
+
+GRAPH_TEMPLATES: Dict[Tuple[str, int, int], GraphTemplate] = {}
+
+
+@attr.s(auto_attribs=True)
+class Snapshot:
+    """Table contents of a loaded dataset, restored instead of loading the dataset again
+
+    Attributes:
+        template: the loaded nodes, used to create the nodes returned on restore
+        tables: table name and binary ``COPY`` data pairs, in restore order
+    """
+
+    template: GraphTemplate
+    tables: List[Tuple[str, bytes]]
+
+
+def copy_rows(pg_driver: PsqlGraphDriver, nodes: Iterable[Node]) -> List[Tuple[str, bytes]]:
+    """Dumps the rows of the given nodes and their outgoing edges with ``COPY TO``"""
+    node_ids: Dict[str, List[str]] = defaultdict(list)
+    src_ids: Dict[str, Set[str]] = defaultdict(set)
+    for node in nodes:
+        node_ids[node.__tablename__].append(node.node_id)
+        for edge in loaded_edges_out(node):
+            src_ids[edge.__tablename__].add(node.node_id)
+
+    queries = [(table, "node_id", ids) for table, ids in node_ids.items()]
+    queries.extend((table, "src_id", sorted(ids)) for table, ids in src_ids.items())
+
+    tables: List[Tuple[str, bytes]] = []
+    with pg_driver.engine.connect() as conn:
+        cursor = conn.connection.cursor()
+        for table, column, ids in queries:
+            query = cursor.mogrify(f"select * from {table} where {column} = any(%s)", (ids,))
+            buffer = io.BytesIO()
+            cursor.copy_expert(f"copy ({query.decode()}) to stdout with (format binary)", buffer)
+            tables.append((table, buffer.getvalue()))
+    return tables
+
+
+@profiled("mark.restore")
+def restore_rows(pg_driver: PsqlGraphDriver, tables: Iterable[Tuple[str, bytes]]) -> None:
+    """Writes rows dumped by :func:`copy_rows` back with ``COPY FROM``"""
+    with pg_driver.engine.connect() as conn, conn.begin():
+        cursor = conn.connection.cursor()
+        for table, data in tables:
+            cursor.copy_expert(f"copy {table} from stdin with (format binary)", io.BytesIO(data))
+
+
+def chunked(records: Iterable[T], size: int) -> Iterator[List[T]]:
+    chunk: List[T] = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def edge_class(src_cls: Type[Node], dst_cls: Type[Node]) -> Optional[Type[Edge]]:
+    """The edge type psqlgraph mocks use to link two node types, the first matching association"""
+    for association, meta in src_cls._pg_edges.items():
+        if issubclass(dst_cls, meta["type"]):
+            for cls in Edge.get_subclasses():
+                if cls.__src_class__ == src_cls.__name__ and cls.__src_dst_assoc__ == association:
+                    return cls
+            return None
+    return None
+
+
+def is_ndjson(resource: Union[str, psqlgml.GmlData]) -> bool:
+    return isinstance(resource, str) and resource.endswith((".ndjson", ".jsonl"))
+
+
+@attr.s(auto_attribs=True)
+class StreamSource:
+    """Node and edge records of a resource, read lazily when possible
+
+    Newline delimited json resources hold one record per line and are read as they are
+    iterated. Records with ``src`` and ``dst`` are edges, records with a ``label`` are nodes
+    and any other record holds resource options like ``unique_field``. Other resources are
+    loaded at once by psqlgml.
+
+    Attributes:
+        path: location of a newline delimited json resource
+        data: an already loaded resource
+    """
+
+    path: Optional[str] = None
+    data: Optional[psqlgml.GmlData] = None
+
+    @classmethod
+    def open(cls, data_dir: str, resource: str) -> "StreamSource":
+        if is_ndjson(resource):
+            return cls(path=os.path.join(data_dir, resource))
+        return cls(data=psqlgml.load_resource(data_dir, resource))
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        if self.data is not None:
+            yield {k: v for k, v in self.data.items() if k not in ("nodes", "edges")}
+            yield from cast(List[Dict[str, Any]], self.data["nodes"])
+            yield from cast(List[Dict[str, Any]], self.data["edges"])
+            return
+
+        if self.path is None:
+            return
+        with open(self.path) as fp:
+            for line in fp:
+                if line.strip():
+                    yield json.loads(line)
+
+    def counts(self) -> Dict[str, int]:
+        """Number of nodes per label"""
+        return dict(Counter(record["label"] for record in self.nodes()))
+
+    def options(self) -> Dict[str, Any]:
+        options: Dict[str, Any] = {}
+        for record in self.records():
+            if "label" not in record and "src" not in record:
+                options.update(record)
+        return options
+
+    def nodes(self) -> Iterator[Dict[str, Any]]:
+        return (r for r in self.records() if "label" in r and "src" not in r)
+
+    def edges(self) -> Iterator[Dict[str, Any]]:
+        return (r for r in self.records() if "src" in r and "dst" in r)
+
+
+@attr.s(auto_attribs=True)
+class SyntheticSource(StreamSource):
+    """Node and edge records of a graph generated from node counts and fan-outs
+
+    Node ids are derived from a namespace, the node label and position, so nodes and edges are
+    generated lazily and independently. Edges follow the first association of the model
+    ``_pg_edges`` between a node type and its parent, in either direction.
+
+    Attributes:
+        spec: node types to generate, parents first
+        model: module holding the node classes
+        namespace: namespace of the node ids, the same namespace always produces the same ids
+        all_props: mock all node properties instead of only the required ones
+    """
+
+    spec: List[models.SyntheticNodes] = attr.ib(factory=list)
+    model: Optional[models.DataModel] = None
+    namespace: uuid.UUID = attr.ib(factory=uuid.uuid4)
+    all_props: bool = False
+
+    @classmethod
+    def create(
+        cls,
+        spec: List[models.SyntheticNodes],
+        model: models.DataModel,
+        seed: Optional[int] = None,
+        all_props: bool = False,
+    ) -> "SyntheticSource":
+        namespace = uuid.uuid4() if seed is None else uuid.uuid5(uuid.NAMESPACE_OID, str(seed))
+        return cls(spec=spec, model=model, namespace=namespace, all_props=all_props)
+
+    def node_id(self, label: str, position: int) -> str:
+        return str(uuid.uuid5(self.namespace, f"{label}:{position}"))
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for entry in self.spec:
+            parent = entry.get("parent")
+            if parent is None:
+                counts[entry["label"]] = entry["count"]
+            elif parent in counts:
+                counts[entry["label"]] = counts[parent] * entry.get("fanout", 1)
+            else:
+                raise ValueError(f"parent '{parent}' of '{entry['label']}' must be listed first")
+        return counts
+
+    def options(self) -> Dict[str, Any]:
+        return {"unique_field": "node_id", "mock_all_props": self.all_props}
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        yield self.options()
+        yield from self.nodes()
+        yield from self.edges()
+
+    def nodes(self) -> Iterator[Dict[str, Any]]:
+        for label, count in self.counts().items():
+            for position in range(count):
+                yield {"label": label, "node_id": self.node_id(label, position)}
+
+    def edges(self) -> Iterator[Dict[str, Any]]:
+        counts = self.counts()
+        for entry in self.spec:
+            parent = entry.get("parent")
+            if parent is None:
+                continue
+            label, fanout = entry["label"], entry.get("fanout", 1)
+            # resolved like psqlgraph mocks do
+            node_base = cast(Any, self.model).Node
+            node_cls, parent_cls = node_base.get_subclass(label), node_base.get_subclass(parent)
+            if edge_class(node_cls, parent_cls):
+                pair = ("src", "dst")
+            elif edge_class(parent_cls, node_cls):
+                pair = ("dst", "src")
+            else:
+                raise ValueError(f"no edge between '{label}' and '{parent}' in the model")
+
+            for parent_position in range(counts[parent]):
+                parent_id = self.node_id(parent, parent_position)
+                for position in range(parent_position * fanout, (parent_position + 1) * fanout):
+                    yield dict(zip(pair, (self.node_id(label, position), parent_id)))
 
 
 @attr.s(auto_attribs=True)
@@ -79,22 +1248,49 @@ class DataFactory:
     dictionary: Optional[models.Dictionary]
     extension: models.MarkExtension
     globals: Optional[Dict[str, Any]]
+    bulk: bool = False
+
+    seed: Optional[int] = None
+    index_threshold: Optional[int] = None
 
     factory: mocks.GraphFactory = None
     mock_data: List[Node] = attr.ib(factory=list)
+    streamed: Dict[str, List[str]] = attr.ib(factory=lambda: defaultdict(list))
 
-    def __attrs_post_init__(self) -> None:
-        self.factory = mocks.GraphFactory(
-            models=self.model,
-            dictionary=self.dictionary,
-            graph_globals=self.globals or {},
+    def template_key(self, source_data: psqlgml.GmlData) -> Tuple[str, int, int]:
+        content = json.dumps(
+            {"data": source_data, "globals": self.globals, "seed": self.seed},
+            sort_keys=True,
+            default=str,
         )
+        digest = hashlib.sha256(content.encode()).hexdigest()
+        return digest, id(self.model), id(self.dictionary)
 
-    def from_source(
-        self,
-        source_data: psqlgml.GmlData,
-    ) -> List[Node]:
-        # do post processing
+    @profiled("mark.generate")
+    def generate(self, source_data: psqlgml.GmlData) -> List[Node]:
+        """Creates the mock nodes described by the source data
+
+        Generated graphs are kept as templates, later calls with the same source data,
+        dictionary, model and globals create new nodes from the template without mocking again
+        """
+        key = self.template_key(source_data)
+        template = GRAPH_TEMPLATES.get(key)
+        if template is None:
+            template = GraphTemplate.from_nodes(self.mock(source_data))
+            GRAPH_TEMPLATES[key] = template
+        return template.create()
+
+    def graph_factory(self) -> mocks.GraphFactory:
+        if self.factory is None:
+            self.factory = mocks.GraphFactory(
+                models=self.model,
+                dictionary=self.dictionary,
+                graph_globals=self.globals or {},
+            )
+        return self.factory
+
+    def mock(self, source_data: psqlgml.GmlData) -> List[Node]:
+        factory = self.graph_factory()
         nodes_cache: Dict[str, psqlgml.GmlNode] = {}
         unique_key: Literal["node_id", "submitter_id"] = source_data.get(
             "unique_field", "submitter_id"
@@ -102,26 +1298,141 @@ class DataFactory:
         mock_all_props = source_data.get("mock_all_props", True)
         for n in source_data["nodes"]:
             nodes_cache[n[unique_key]] = n
-        self.mock_data = self.factory.create_from_nodes_and_edges(
-            unique_key=unique_key,
-            all_props=mock_all_props,
-            nodes=source_data["nodes"],
-            edges=source_data["edges"],
-        )
+
+        with seeded(self.seed):
+            nodes = source_data["nodes"]
+            if self.seed is not None:
+                nodes = [{"node_id": seeded_node_id(), **n} for n in nodes]
+            return factory.create_from_nodes_and_edges(
+                unique_key=unique_key,
+                all_props=mock_all_props,
+                nodes=nodes,
+                edges=source_data["edges"],
+            )
+
+    def from_source(
+        self,
+        source_data: psqlgml.GmlData,
+    ) -> List[Node]:
+        self.mock_data = self.generate(source_data)
         self.extension.pre(self.mock_data)
-        with self.pg_driver.session_scope(can_inherit=False) as s:
-            for node in self.mock_data:
-                self.extension.run(node)
-                s.add(node)
+        self.write(self.mock_data)
         self.extension.post(self.mock_data)
         return self.mock_data
 
+    @contextmanager
+    def writing(self, size: int, tables: Callable[[], Iterable[Table]]) -> Iterator[Any]:
+        """Session writing a graph in a single transaction
+
+        Graphs of at least ``index_threshold`` nodes are written with deferred index maintenance
+
+        Args:
+            size: number of nodes of the graph
+            tables: returns the tables written
+        """
+        with self.pg_driver.session_scope(can_inherit=False) as s:
+            if self.index_threshold is None or size < self.index_threshold:
+                yield s
+                return
+
+            with deferred_indexes(s.connection(), tables()):
+                yield s
+
+    @profiled("mark.insert")
+    def write(self, nodes: List[Node]) -> None:
+        with self.writing(len(nodes), lambda: graph_tables(nodes)) as s:
+            self.insert(s, nodes)
+
+    def insert(self, session: Any, nodes: List[Node]) -> None:
+        for node in nodes:
+            self.extension.run(node)
+            if not self.bulk:
+                session.add(node)
+        if self.bulk:
+            bulk_insert(session, nodes)
+        session.flush()
+
+    @profiled("mark.stream")
+    def stream(self, source: "StreamSource", chunk_size: int = BULK_CHUNK_SIZE) -> List[str]:
+        """Mocks and writes the nodes of a resource in chunks, then its edges
+
+        Only the ids of the written nodes are kept in memory. The extension hooks are called
+        for every chunk of nodes, edges are always written with multi row inserts. The resource
+        is written in a single transaction, its index maintenance is deferred when it holds at
+        least ``index_threshold`` nodes.
+
+        Args:
+            source: the resource records
+            chunk_size: number of nodes or edges written at once
+        Returns:
+            ids of the written nodes
+        """
+        factory = self.graph_factory()
+        options = source.options()
+        unique_key = options.get("unique_field", "submitter_id")
+        all_props = options.get("mock_all_props", True)
+        # the index maintenance is decided once for the whole resource
+        counts = source.counts() if self.index_threshold is not None else {}
+
+        written: Dict[str, Tuple[str, Type[Node]]] = {}
+        edge_classes: Dict[Tuple[Type[Node], Type[Node]], Optional[Type[Edge]]] = {}
+        with self.writing(sum(counts.values()), lambda: label_tables(self.model, counts)) as s:
+            with seeded(self.seed):
+                for chunk in chunked(source.nodes(), chunk_size):
+                    nodes = []
+                    for meta in chunk:
+                        meta = dict(meta)
+                        if self.seed is not None:
+                            meta.setdefault("node_id", seeded_node_id())
+                        nodes.append(
+                            factory.node_factory.create(
+                                meta.pop("label"), override=meta, all_props=all_props
+                            )
+                        )
+                    self.extension.pre(nodes)
+                    self.insert(s, nodes)
+                    self.extension.post(nodes)
+                    for node in nodes:
+                        written[node[unique_key]] = (node.node_id, type(node))
+                        self.streamed[node.__tablename__].append(node.node_id)
+                    # written nodes are not kept by the session
+                    s.expunge_all()
+
+            for chunk in chunked(source.edges(), chunk_size):
+                # edges are written as plain rows, without creating edge instances
+                edge_rows: Dict[Table, List[Dict[str, Any]]] = defaultdict(list)
+                for meta in chunk:
+                    src, dst = written.get(meta["src"]), written.get(meta["dst"])
+                    edge_cls = None
+                    if src and dst:
+                        classes = (src[1], dst[1])
+                        if classes not in edge_classes:
+                            edge_classes[classes] = edge_class(*classes)
+                        edge_cls = edge_classes[classes]
+                    if not src or not dst or not edge_cls:
+                        logger.debug(f"no edge between {meta['src']} and {meta['dst']}")
+                        continue
+                    edge_rows[edge_cls.__table__].append({"src_id": src[0], "dst_id": dst[0]})
+                for table, rows in edge_rows.items():
+                    insert_table_rows(s, table, rows, chunk_size)
+
+        return [node_id for ids in self.streamed.values() for node_id in ids]
+
+    @profiled("mark.clean")
     def clean(self) -> None:
+        """Deletes the generated nodes with one statement per node table
+
+        Edges are removed by the cascading foreign keys of the edge tables
+        """
+        node_ids: Dict[str, List[str]] = defaultdict(list)
+        for node in self.mock_data:
+            node_ids[node.__tablename__].append(node.node_id)
+        for table, ids in self.streamed.items():
+            node_ids[table].extend(ids)
+
         with self.pg_driver.session_scope() as sxn:
-            for node in self.mock_data:
-                node = self.pg_driver.nodes().get(node.node_id)
-                if node:
-                    sxn.delete(node)
+            for table, ids in node_ids.items():
+                sxn.execute(text(f"delete from {table} where node_id = any(:ids)"), {"ids": ids})
 
 
 @attr.s(auto_attribs=True)
@@ -140,57 +1451,381 @@ class MarkHandler:
             globals=self.driver.globals,
             dictionary=self.driver.dictionary,
             extension=cls(g=self.driver.g),
+            # generated graphs are written in bulk unless asked otherwise
+            bulk=self.mark.get("bulk", "synthetic" in self.mark),
+            seed=self.mark.get("deterministic_seed"),
+            index_threshold=self.driver.deferred_index_threshold,
         )
 
     @property
     def driver(self) -> models.DatabaseDriver:
         return self.fixture.driver
 
-    def pre(self) -> List[Node]:
+    @profiled("mark.load")
+    def pre(self) -> List[Any]:
+        """Loads the mark resource
+
+        Returns:
+            the created nodes, or only their ids when the resource is streamed or generated
+        """
+        synthetic = self.mark.get("synthetic")
+        if synthetic:
+            source = SyntheticSource.create(
+                synthetic,
+                self.driver.model,
+                seed=self.factory.seed,
+                all_props=self.mark.get("mock_all_props", False),
+            )
+            return self.factory.stream(source)
 
         resource = self.mark["resource"]
+        if isinstance(resource, dict) and self.mark.get("stream", False):
+            return self.factory.stream(StreamSource(data=resource))
+        if isinstance(resource, str) and (self.mark.get("stream", False) or is_ndjson(resource)):
+            # streamed resources are not validated, they would have to be loaded at once
+            return self.factory.stream(StreamSource.open(self.mark["data_dir"], resource))
+
         if isinstance(resource, dict):
             if validate_resource(resource, self.driver.dictionary):
                 raise ValueError("Data Error")
-            return self.factory.from_source(resource)
+            return self.load(resource)
 
         data_dir = self.mark["data_dir"]
-        source_data = psqlgml.load_resource(data_dir, resource)
-        # do validation
-        if validate_file_resource(resource, data_dir, self.driver.dictionary):
+        source_data, violations = RESOURCE_CACHE.load(data_dir, resource, self.driver.dictionary)
+        if violations:
             raise ValueError("Invalid data specified")
-        return self.factory.from_source(source_data)
+        return self.load(source_data)
+
+    def load(self, source_data: psqlgml.GmlData) -> List[Node]:
+        if not self.mark.get("snapshot", False):
+            return self.factory.from_source(source_data)
+
+        extension = self.mark.get("extension")
+        if extension and extension is not models.MarkExtension:
+            # only the graph rows are copied, rows written by the hooks would be lost on restore
+            raise ValueError(
+                f"snapshot can not be used with the extension {extension.__qualname__}"
+            )
+
+        digest, _, _ = self.factory.template_key(source_data)
+        self.factory.mock_data = self.fixture.load_snapshot(
+            digest, lambda: self.factory.from_source(source_data)
+        )
+        return self.factory.mock_data
 
     def post(self) -> None:
+        if self.fixture.in_test:
+            # the driver fixture cleans up all tables at the end of the test
+            return
         self.factory.clean()
 
 
+def mark_key(mark: models.PsqlgraphDataMark) -> str:
+    """Identifies the data loaded by a mark, marks with the same key load the same graph"""
+    resource = mark.get("resource")
+    if "synthetic" in mark:
+        source = json.dumps(
+            [mark["synthetic"], mark.get("mock_all_props", False)], sort_keys=True, default=str
+        )
+    elif isinstance(resource, dict):
+        source = json.dumps(resource, sort_keys=True, default=str)
+    else:
+        source = os.path.join(mark["data_dir"], str(resource))
+    cls = mark.get("extension") or models.MarkExtension
+    content = json.dumps(
+        [
+            source,
+            f"{cls.__module__}.{cls.__qualname__}",
+            mark.get("bulk", False),
+            mark.get("deterministic_seed"),
+        ]
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def dictionary_hash(dictionary: models.Dictionary) -> str:
+    """Computes a hash of the dictionary content"""
+    content = json.dumps(dictionary.schema, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+@attr.s(auto_attribs=True)
+class SchemaCache:
+    """Cache of psqlgml schemas generated from dictionaries
+
+    Schemas are generated at most once per dictionary instance. When a location is set, the
+    generated files are kept there per dictionary content hash and reused by later sessions
+
+    Attributes:
+        location: optional directory holding generated schemas across sessions
+    """
+
+    location: Optional[str] = None
+    entries: Dict[int, Tuple[models.Dictionary, psqlgml.Dictionary, psqlgml.GmlSchema]] = attr.ib(
+        factory=dict
+    )
+
+    def get(self, dictionary: models.Dictionary) -> Tuple[psqlgml.Dictionary, psqlgml.GmlSchema]:
+        entry = self.entries.get(id(dictionary))
+        if entry is None or entry[0] is not dictionary:
+            entry = (dictionary, *self.load(dictionary))
+            self.entries[id(dictionary)] = entry
+        return entry[1], entry[2]
+
+    def load(self, dictionary: models.Dictionary) -> Tuple[psqlgml.Dictionary, psqlgml.GmlSchema]:
+        dictionary_name = f"{dictionary.__module__}.{dictionary.__class__.__name__}"
+        di = psqlgml.from_object(
+            dictionary.schema, name=dictionary_name, version="pytest_psqlgraph"
+        )
+        if not self.location:
+            psqlgml.generate(di)
+            return di, psqlgml.read_schema(dictionary_name, version="pytest_psqlgraph")
+
+        schema_location = f"{self.location}/{dictionary_hash(dictionary)}"
+        if not os.path.exists(schema_location):
+            logger.debug(f"generating schema for {dictionary_name} into {schema_location}")
+            # generate aside then move in place, concurrent sessions may be doing the same
+            staging = f"{schema_location}.{os.getpid()}"
+            psqlgml.generate(di, output_location=staging)
+            try:
+                os.replace(staging, schema_location)
+            except OSError:
+                shutil.rmtree(staging, ignore_errors=True)
+        schema = psqlgml.read_schema(
+            dictionary_name, version="pytest_psqlgraph", schema_location=schema_location
+        )
+        return di, schema
+
+
+SCHEMA_CACHE = SchemaCache()
+
+
 def read_schema(
     dictionary: models.Dictionary,
 ) -> Tuple[psqlgml.Dictionary, psqlgml.GmlSchema]:
-    dictionary_name = f"{dictionary.__module__}.{dictionary.__class__.__name__}"
-    di = psqlgml.from_object(dictionary.schema, name=dictionary_name, version="pytest_psqlgraph")
-    psqlgml.generate(di)
-    return di, psqlgml.read_schema(dictionary_name, version="pytest_psqlgraph")
+    return SCHEMA_CACHE.get(dictionary)
 
 
-def validate_file_resource(
+def collect_violations(req: psqlgml.ValidationRequest) -> Set[psqlgml.DataViolation]:
+    grouped_violations = psqlgml.validate(req, print_error=True)
+    violations: Set[psqlgml.DataViolation] = set.union(*grouped_violations.values())
+    return violations
+
+
+def file_validation_request(
     data_file: str, data_dir: str, dictionary: models.Dictionary
-) -> Set[psqlgml.DataViolation]:
+) -> psqlgml.ValidationRequest:
     di, schema = read_schema(dictionary)
-    req = psqlgml.ValidationRequest(
+    return psqlgml.ValidationRequest(
         data_file=data_file, data_dir=data_dir, schema=schema, dictionary=di
     )
-    grouped_violations = psqlgml.validate(req, print_error=True)
-    violations: Set[psqlgml.DataViolation] = set.union(*grouped_violations.values())
-    return violations
 
 
+def validate_file_resource(
+    data_file: str, data_dir: str, dictionary: models.Dictionary
+) -> Set[psqlgml.DataViolation]:
+    return collect_violations(file_validation_request(data_file, data_dir, dictionary))
+
+
+@profiled("mark.validate")
 def validate_resource(
     resource: psqlgml.GmlData, dictionary: models.Dictionary
 ) -> Set[psqlgml.DataViolation]:
     di, schema = read_schema(dictionary)
     req = psqlgml.ValidationRequest("data object", "", schema, di, payload={"": resource})
-    grouped_violations = psqlgml.validate(req, print_error=True)
-    violations: Set[psqlgml.DataViolation] = set.union(*grouped_violations.values())
-    return violations
+    return collect_violations(req)
+
+
+def validate_requests(
+    requests: List[psqlgml.ValidationRequest], processes: int = 1
+) -> List[Set[psqlgml.DataViolation]]:
+    """Validates data files, in a pool of processes when more than one is allowed
+
+    Args:
+        requests: validation requests, with the schema and dictionary to validate against
+        processes: maximum number of processes
+    Returns:
+        the violations found, in the order of the requests
+    """
+    processes = min(processes, len(requests))
+    if processes <= 1:
+        return [collect_violations(req) for req in requests]
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(collect_violations, requests))
+
+
+def file_stamp(path: str) -> Tuple[int, int]:
+    """modification time and size of a file"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+@attr.s(auto_attribs=True)
+class CachedResource:
+    """A loaded data resource with its validation result
+
+    Attributes:
+        data: the loaded resource, with extended resources merged in
+        violations: violations found validating the resource
+        stamps: modification time and size of the resource and all the resources it extends
+    """
+
+    data: psqlgml.GmlData
+    violations: Set[psqlgml.DataViolation]
+    stamps: Dict[str, Tuple[int, int]]
+
+    def is_fresh(self) -> bool:
+        try:
+            return all(file_stamp(path) == stamp for path, stamp in self.stamps.items())
+        except OSError:
+            return False
+
+
+class ValidationStore(Protocol):
+    """Persistent key value store, as provided by pytest's ``config.cache``"""
+
+    def get(self, key: str, default: Any) -> Any:
+        ...
+
+    def set(self, key: str, value: Any) -> None:
+        ...
+
+
+def content_hash(paths: Iterable[str], dictionary: models.Dictionary) -> str:
+    """Computes a hash of the content of data files and the dictionary they are validated against"""
+    digest = hashlib.sha256(dictionary_hash(dictionary).encode())
+    for path in sorted(paths):
+        digest.update(path.encode())
+        with open(path, "rb") as fp:
+            digest.update(hashlib.sha256(fp.read()).digest())
+    return digest.hexdigest()
+
+
+# a loaded resource, its pending validation request and its validation store key
+PreparedResource = Tuple[CachedResource, Optional[psqlgml.ValidationRequest], Optional[str]]
+
+
+@attr.s(auto_attribs=True)
+class ResourceCache:
+    """Cache of loaded and validated data resource files
+
+    Entries are keyed by absolute file path and dictionary, and are reloaded whenever one of
+    the files involved changes. Each call returns a copy of the cached data.
+
+    When a store is set, validation results are also kept there by file content and dictionary,
+    so unchanged files are not validated again in later sessions.
+
+    Attributes:
+        store: optional persistent store of validation results
+    """
+
+    store: Optional[ValidationStore] = None
+    entries: Dict[Tuple[str, int], CachedResource] = attr.ib(factory=dict)
+
+    @profiled("mark.validate")
+    def load(
+        self, data_dir: str, resource: str, dictionary: models.Dictionary
+    ) -> Tuple[psqlgml.GmlData, Set[psqlgml.DataViolation]]:
+        key = (os.path.abspath(os.path.join(data_dir, resource)), id(dictionary))
+        entry = self.entries.get(key)
+        if entry is None or not entry.is_fresh():
+            entry = self.read(data_dir, resource, dictionary)
+            self.entries[key] = entry
+        return copy.deepcopy(entry.data), entry.violations
+
+    @profiled("mark.validate")
+    def preload(
+        self, resources: Iterable[Tuple[str, str, models.Dictionary]], processes: int = 1
+    ) -> Dict[str, Set[psqlgml.DataViolation]]:
+        """Loads and validates resources ahead of their use
+
+        Args:
+            resources: data directory, resource file name and dictionary of each resource
+            processes: maximum number of processes validating resources concurrently
+        Returns:
+            the violations found, by resource file path
+        """
+        keys: List[Tuple[str, int]] = []
+        pending: Dict[Tuple[str, int], Tuple[str, str, models.Dictionary]] = {}
+        for data_dir, resource, dictionary in resources:
+            key = (os.path.abspath(os.path.join(data_dir, resource)), id(dictionary))
+            keys.append(key)
+            entry = self.entries.get(key)
+            if entry is None or not entry.is_fresh():
+                pending[key] = (data_dir, resource, dictionary)
+
+        prepared: Dict[Tuple[str, int], PreparedResource] = {}
+        for key, (data_dir, resource, dictionary) in pending.items():
+            try:
+                prepared[key] = self.prepare(data_dir, resource, dictionary)
+            except Exception as e:
+                # left to the tests using the resource, they report the error
+                logger.warning(f"unable to load {resource} from {data_dir}: {e}")
+
+        for key, entry in zip(prepared, self.validate_all(list(prepared.values()), processes)):
+            self.entries[key] = entry
+
+        return {
+            key[0]: self.entries[key].violations
+            for key in keys
+            if (key in prepared or key not in pending) and self.entries[key].violations
+        }
+
+    def read(self, data_dir: str, resource: str, dictionary: models.Dictionary) -> CachedResource:
+        return self.validate_all([self.prepare(data_dir, resource, dictionary)])[0]
+
+    def prepare(
+        self, data_dir: str, resource: str, dictionary: models.Dictionary
+    ) -> PreparedResource:
+        """Loads a resource along with its validation request, None when a stored result is used"""
+        req = file_validation_request(resource, data_dir, dictionary)
+        paths = [os.path.abspath(os.path.join(data_dir, name)) for name in req.payload]
+        entry = CachedResource(
+            data=psqlgml.load_resource(data_dir, resource),
+            violations=set(),
+            stamps={path: file_stamp(path) for path in paths},
+        )
+
+        key = self.store_key(paths, dictionary)
+        stored = self.stored_violations(key, req)
+        if stored is not None:
+            entry.violations = stored
+            return entry, None, key
+        return entry, req, key
+
+    def validate_all(
+        self, resources: List[PreparedResource], processes: int = 1
+    ) -> List[CachedResource]:
+        """Validates prepared resources together, stored validation results are reused"""
+        pending = [(entry, req, key) for entry, req, key in resources if req is not None]
+        results = validate_requests([req for _, req, _ in pending], processes)
+        for (entry, _, key), violations in zip(pending, results):
+            entry.violations = violations
+            if key is not None and self.store is not None:
+                self.store.set(key, [attr.asdict(v) for v in sorted(violations, key=repr)])
+        return [entry for entry, _, _ in resources]
+
+    def store_key(self, paths: List[str], dictionary: models.Dictionary) -> Optional[str]:
+        if self.store is None:
+            return None
+        return f"psqlgraph/validation/{content_hash(paths, dictionary)}"
+
+    def stored_violations(
+        self, key: Optional[str], req: psqlgml.ValidationRequest
+    ) -> Optional[Set[psqlgml.DataViolation]]:
+        if key is None or self.store is None:
+            return None
+        stored: Optional[List[Dict[str, Any]]] = self.store.get(key, None)
+        if stored is None:
+            return None
+
+        logger.debug(f"reusing validation result of {req.data_file}")
+        violations = {psqlgml.DataViolation(**v) for v in stored}
+        for violation in sorted(violations, key=repr):
+            log = logger.warning if violation.level == "warning" else logger.error
+            log(f"{req.data_file}: {violation.path}: {violation.name}: {violation.message}")
+        return violations
+
+
+RESOURCE_CACHE = ResourceCache()
@@ -1,11 +1,31 @@
-from typing import Any, Dict, Iterable, Optional, Type, Union
+from typing import Any, Dict, Iterable, List, Optional, Type, Union
 
 import attr
 import psqlgml
 import psqlgraph
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import DeclarativeMeta
 
-from pytest_psqlgraph.typings import Protocol, TypedDict
+from pytest_psqlgraph.typings import Literal, Protocol, TypedDict
+
+IsolationMode = Literal["truncate", "rollback"]
+MarkScope = Literal["function", "module", "session"]
+
+
+class SyntheticNodes(TypedDict, total=False):
+    """Nodes of a generated graph
+
+    Attributes:
+        label: node type
+        count: number of nodes, for node types without a parent
+        parent: label of the parent node type, listed before this one
+        fanout: number of nodes linked to each parent node
+    """
+
+    label: str
+    count: int
+    parent: str
+    fanout: int
 
 
 class PsqlgraphDataMark(TypedDict, total=False):
@@ -14,6 +34,13 @@ class PsqlgraphDataMark(TypedDict, total=False):
     data_dir: str
     resource: Union[str, psqlgml.GmlData]
     extension: Type["MarkExtension"]
+    bulk: bool
+    deterministic_seed: int
+    scope: MarkScope
+    snapshot: bool
+    stream: bool
+    synthetic: List[SyntheticNodes]
+    mock_all_props: bool
 
 
 class Dictionary(Protocol):
@@ -46,6 +73,23 @@ class DatabaseDriverConfig:
             psqlgraph ORMBase
         extra_bases: Iterable of bases that needs to be created/destroyed as part of the driver
         globals: optional default property keys and values used for all nodes created
+        isolation_mode: how tests are isolated from each other, ``truncate`` (default) deletes
+            all table entries before and after each test, ``rollback`` runs each test inside a
+            transaction and savepoint that is rolled back at tear down
+        track_writes: when truncating, only clean up tables written through the driver since
+            the last clean up, tables written by other connections will not be cleaned
+        reuse_schema: keep the tables at the end of the session and reuse them in the next
+            one as long as the models are unchanged, the schema is recreated otherwise
+        engine_options: extra keyword arguments passed to sqlalchemy ``create_engine``, like
+            ``pool_size``, ``pool_pre_ping`` or ``poolclass``
+        statement_timeout: optional server side timeout in milliseconds for every statement
+        warm_pool: number of pool connections opened before the first test runs
+        unlogged: create all tables as ``UNLOGGED`` and turn off ``synchronous_commit`` on the
+            driver connections, writes skip the write ahead log and do not wait for disk
+            flushes. Data does not survive a server crash, which is of no concern for tests
+        deferred_index_threshold: number of nodes from which mark data is loaded with the non
+            unique indexes of the written tables dropped and foreign key checks deferred, the
+            indexes are rebuilt once the data is written. None, the default, disables it
     """
 
     host: str
@@ -58,6 +102,39 @@ class DatabaseDriverConfig:
     orm_base: Optional[DeclarativeMeta] = None
     extra_bases: Optional[Iterable[DeclarativeMeta]] = None
     globals: Optional[Dict[str, Any]] = None
+    isolation_mode: IsolationMode = "truncate"
+    track_writes: bool = False
+    reuse_schema: bool = False
+    engine_options: Optional[Dict[str, Any]] = None
+    statement_timeout: Optional[int] = None
+    warm_pool: int = 0
+    unlogged: bool = False
+    deferred_index_threshold: Optional[int] = None
+
+    @property
+    def url(self) -> str:
+        """connection url of the configured database, as built by psqlgraph"""
+        return f"postgresql://{self.user}:{self.password}@{self.host}/{self.database}"
+
+    @property
+    def engine_kwargs(self) -> Dict[str, Any]:
+        """keyword arguments used to create the driver engine"""
+        kwargs = dict(self.engine_options or {})
+        settings = []
+        if self.statement_timeout is not None:
+            settings.append(f"-c statement_timeout={self.statement_timeout}")
+        if self.unlogged:
+            settings.append("-c synchronous_commit=off")
+        if settings:
+            connect_args = dict(kwargs.get("connect_args", {}))
+            options = connect_args.get("options", "")
+            connect_args["options"] = " ".join([options, *settings])
+            kwargs["connect_args"] = connect_args
+        return kwargs
+
+
+# engines shared by all drivers using the same connection url and engine options
+ENGINES: Dict[str, Engine] = {}
 
 
 @attr.s(auto_attribs=True)
@@ -66,13 +143,18 @@ class DatabaseDriver:
     g: psqlgraph.PsqlGraphDriver = attr.ib(init=False)
 
     def __attrs_post_init__(self) -> None:
+        kwargs = self.config.engine_kwargs
         self.g = psqlgraph.PsqlGraphDriver(
             host=self.config.host,
             user=self.config.user,
             database=self.config.database,
             password=self.config.password,
+            **kwargs,
         )
         self.g.package_namespace = self.config.package_namespace
+        # engines are created lazily, the unused one never opens a connection
+        key = f"{self.config.url}:{sorted(kwargs.items())!r}"
+        self.g.engine = ENGINES.setdefault(key, self.g.engine)
 
     @property
     def package_namespace(self) -> Optional[str]:
@@ -100,6 +182,32 @@ class DatabaseDriver:
     def dictionary(self) -> Dictionary:
         return self.config.dictionary
 
+    @property
+    def isolation_mode(self) -> IsolationMode:
+        return self.config.isolation_mode
+
+    @property
+    def track_writes(self) -> bool:
+        return self.config.track_writes
+
+    @property
+    def reuse_schema(self) -> bool:
+        return self.config.reuse_schema
+
+    @property
+    def unlogged(self) -> bool:
+        return self.config.unlogged
+
+    @property
+    def deferred_index_threshold(self) -> Optional[int]:
+        return self.config.deferred_index_threshold
+
+    def warm_up(self) -> None:
+        """Opens the configured number of pool connections ahead of the first test"""
+        connections = [self.g.engine.connect() for _ in range(self.config.warm_pool)]
+        for connection in connections:
+            connection.close()
+
     def create_all(self) -> None:
         self.orm_base.metadata.create_all(self.g.engine)
 
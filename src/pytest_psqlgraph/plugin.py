@@ -1,7 +1,14 @@
+import asyncio
+import functools
+import json
 import logging
+import os
+from collections import defaultdict
 from pathlib import Path
-from typing import Dict, cast
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, cast
 
+import attr
+import psqlgraph
 import pytest
 from _pytest import fixtures as f
 from _pytest import main as m
@@ -9,15 +16,52 @@ from _pytest import python as p
 
 from . import helpers, models
 
+try:
+    import pytest_asyncio  # provides the event_loop fixture
+
+    from . import aio
+except ImportError:  # asyncpg and pytest-asyncio are optional
+    aio = None  # type: ignore
+    pytest_asyncio = None
+
 logger = logging.getLogger(__name__)
 CONFIG_FIXTURE_NAME: str = "psqlgraph_config"
 MARKER_NAME: str = "psqlgraph_data"
 ACTIVE_DB_FIXTURES: Dict[str, helpers.DatabaseFixture] = {}
+DB_CONFIGS: Dict[str, models.DatabaseDriverConfig] = {}
+# databases set up ahead of their fixture, or waiting for their tear down
+PREPARED_DB_FIXTURES: Dict[str, helpers.DatabaseFixture] = {}
+FINISHED_DB_FIXTURES: List[helpers.DatabaseFixture] = []
+# drivers used by the running test, cleaned up together once the test is torn down
+TEST_DB_FIXTURES: List[helpers.DatabaseFixture] = []
 
 
 def pytest_addoption(parser: m.Parser) -> None:
     group = parser.getgroup("psqlgraph")
     group.addoption("--data-dir", help="default test data files directory")
+    group.addoption(
+        "--psqlgraph-profile",
+        action="store_true",
+        default=False,
+        help="report the time spent in psqlgraph fixtures and the statements executed",
+    )
+    group.addoption(
+        "--psqlgraph-profile-top",
+        type=int,
+        default=10,
+        help="number of slowest tests listed in the psqlgraph profile",
+    )
+    group.addoption("--psqlgraph-profile-json", help="write the psqlgraph profile to a json file")
+    group.addoption(
+        "--psqlgraph-validation-processes",
+        type=int,
+        help="number of processes validating data files at collection, defaults to the cpu count",
+    )
+    group.addoption(
+        "--psqlgraph-threads",
+        type=int,
+        help="number of drivers set up or cleaned up concurrently, defaults to all of them",
+    )
     parser.addini(
         "psqlgraph-data-dir", default="tests/data", help="default test data files directory"
     )
@@ -30,6 +74,15 @@ def pytest_configure(config: f.Config) -> None:
             MARKER_NAME
         ),
     )
+    helpers.PROFILER.enabled = bool(
+        config.getoption("--psqlgraph-profile") or config.getoption("--psqlgraph-profile-json")
+    )
+    # generated dictionary schemas and validation results are kept across sessions when the
+    # cache plugin is active
+    cache = getattr(config, "cache", None)
+    if cache:
+        helpers.SCHEMA_CACHE.location = str(cache.makedir("psqlgraph_schemas"))
+        helpers.RESOURCE_CACHE.store = cache
 
 
 def pytest_collection_finish(session: m.Session) -> None:
@@ -62,16 +115,13 @@ def pytest_collection_finish(session: m.Session) -> None:
         cfg: Dict[str, models.DatabaseDriverConfig] = request.getfixturevalue(CONFIG_FIXTURE_NAME)
         for name, config in cfg.items():
 
-            if name in ACTIVE_DB_FIXTURES:
+            plugin_name = f"psqlgraph-{name}"
+            if session.config.pluginmanager.has_plugin(plugin_name):
                 continue
 
-            driver = models.DatabaseDriver(config)
-            logger.debug(f"initializing fixture {name}")
-
-            fixture = helpers.DatabaseFixture(name, driver)
-            fixture.pre_config()
-            session.addfinalizer(fixture.post_config)
-            ACTIVE_DB_FIXTURES[name] = fixture
+            # fixtures of registered plugins are picked up by the fixture manager
+            session.config.pluginmanager.register(driver_fixtures(name, config), plugin_name)
+            DB_CONFIGS[name] = config
 
     except pytest.FixtureLookupError:
         print(f"fixture '{CONFIG_FIXTURE_NAME}'not found")
@@ -79,22 +129,181 @@ def pytest_collection_finish(session: m.Session) -> None:
             f"pytest-psqlgraph config fixture '{CONFIG_FIXTURE_NAME}' not found",
             exc_info=True,
         )
+        return
+
+    preload_resources(session)
+
+
+def mark_data_dir(mark: models.PsqlgraphDataMark, config: f.Config) -> Path:
+    return Path(
+        mark.get("data_dir")
+        or config.getoption("--data-dir")
+        or config.getini("psqlgraph-data-dir")
+        or ""
+    )
+
+
+def preload_resources(session: m.Session) -> None:
+    """Validates the data files of all collected marks before any test runs
+
+    Distinct files are validated concurrently in a process pool, the results are kept for the
+    run so that loading the data of a test does not validate it again.
+
+    Raises:
+        pytest.UsageError: when a data file does not match the dictionary of its driver
+    """
+    resources: Dict[Tuple[str, str, int], Tuple[str, str, models.Dictionary]] = {}
+    for item in session.items:
+        for marker in item.iter_markers(name=MARKER_NAME):
+            mark = cast(models.PsqlgraphDataMark, marker.kwargs)
+            resource = mark.get("resource")
+            config = DB_CONFIGS.get(mark.get("driver_name", ""))
+            if (
+                config is None
+                or not isinstance(resource, str)
+                or mark.get("stream", False)
+                or helpers.is_ndjson(resource)
+            ):
+                continue
+            data_dir = mark_data_dir(mark, session.config)
+            if data_dir.exists():
+                key = (str(data_dir.absolute()), resource, id(config.dictionary))
+                resources[key] = (str(data_dir.absolute()), resource, config.dictionary)
+
+    processes = session.config.getoption("--psqlgraph-validation-processes") or os.cpu_count()
+    if hasattr(session.config, "workerinput"):
+        # pytest-xdist workers already run in parallel
+        processes = 1
+    invalid = helpers.RESOURCE_CACHE.preload(resources.values(), processes or 1)
+    if invalid:
+        raise pytest.UsageError(
+            "pytest-psqlgraph found invalid data files: " + ", ".join(sorted(invalid))
+        )
+
 
+@attr.s(auto_attribs=True, eq=False)
+class DriverFixtures:
+    """Fixtures of a configured driver, registered as a plugin"""
 
-def __get_or_make_driver_fixture__(arg_name: str, request: f.SubRequest) -> None:
-    """Check if a driver fixture is currently defined and create, inject it if it is not defined.
+    database: Callable[..., Iterator[helpers.DatabaseFixture]]
+    driver: Callable[..., Iterator[psqlgraph.PsqlGraphDriver]]
+    async_driver: Optional[Callable[..., Iterator[Any]]] = None
+
+
+def db_fixture_name(name: str) -> str:
+    return f"__psqlgraph_{name}_db__"
+
+
+def driver_fixtures(name: str, config: models.DatabaseDriverConfig) -> DriverFixtures:
+    """Creates the fixtures of a configured driver
+
+    A session scoped fixture sets up the database the first time a test uses the driver and
+    tears it down at the end of the session, the function scoped fixture named after the driver
+    isolates each test. When asyncpg and pytest-asyncio are installed, the ``<name>_async`` fixture provides an
+    asyncpg backed driver to asyncio tests, it cleans the tables at tear down.
 
     Args:
-        arg_name: name for the fixture
-        request: pytest request context
+        name: name of the configured driver
+        config: driver configuration
+    Returns:
+        both fixtures, to be registered as a plugin
     """
-    try:
-        request.getfixturevalue(arg_name)
-    except f.FixtureLookupError:
-        if arg_name not in ACTIVE_DB_FIXTURES:
-            return
-        fixture = ACTIVE_DB_FIXTURES[arg_name]
-        inject_driver_fixture(fixture, request)
+
+    @pytest.fixture(scope="session", name=db_fixture_name(name))
+    def database(request: f.SubRequest) -> Iterator[helpers.DatabaseFixture]:
+        fixture = PREPARED_DB_FIXTURES.pop(name, None) or setup_database(
+            name, config, request.config
+        )
+        ACTIVE_DB_FIXTURES[name] = fixture
+        yield fixture
+        ACTIVE_DB_FIXTURES.pop(name, None)
+        # databases are torn down together, once all session fixtures are
+        FINISHED_DB_FIXTURES.append(fixture)
+
+    @pytest.fixture(name=name)
+    def pg_driver(request: f.SubRequest) -> Iterator[psqlgraph.PsqlGraphDriver]:
+        fixture: helpers.DatabaseFixture = request.getfixturevalue(db_fixture_name(name))
+        # isolation may already be set up along with the other drivers of the test
+        yield fixture.driver.g if fixture.in_test else fixture.pre_test()
+        fixture.post_test(defer_clean=True)
+        TEST_DB_FIXTURES.append(fixture)
+
+    fixtures = DriverFixtures(database=database, driver=pg_driver)
+    if aio is None:
+        return fixtures
+
+    # runs on the test's event loop itself: pytest-asyncio only wraps async fixtures known at
+    # collection in strict mode, these are registered after it
+    @pytest.fixture(name=f"{name}_async")
+    def async_driver(
+        request: f.SubRequest, event_loop: asyncio.AbstractEventLoop
+    ) -> Iterator[aio.AsyncDriver]:
+        fixture: helpers.DatabaseFixture = request.getfixturevalue(db_fixture_name(name))
+        driver = event_loop.run_until_complete(aio.AsyncDriver.connect(fixture))
+        yield driver
+        try:
+            event_loop.run_until_complete(driver.clean())
+        finally:
+            event_loop.run_until_complete(driver.close())
+
+    fixtures.async_driver = async_driver
+    return fixtures
+
+
+def setup_database(
+    name: str, config: models.DatabaseDriverConfig, pytest_config: f.Config
+) -> helpers.DatabaseFixture:
+    """Creates the database fixture of a driver and sets up its tables"""
+    worker = None
+    db_config = config
+    # set by pytest-xdist on worker processes
+    workerinput: Dict[str, str] = getattr(pytest_config, "workerinput", {})
+    if "workerid" in workerinput:
+        worker = helpers.WorkerDatabase(
+            config, workerinput["workerid"], workerinput["testrunuid"]
+        )
+        db_config = worker.config
+
+    driver = models.DatabaseDriver(db_config)
+    logger.debug(f"initializing fixture {name}")
+
+    helpers.PROFILER.instrument(driver.g.engine)
+    fixture = helpers.DatabaseFixture(name, driver, worker=worker)
+    fixture.pre_config()
+    driver.warm_up()
+    return fixture
+
+
+def prepare_databases(names: List[str], pytest_config: f.Config) -> None:
+    """Sets up the databases of several drivers at once, ahead of their session fixtures"""
+    pending = [n for n in names if n not in ACTIVE_DB_FIXTURES and n not in PREPARED_DB_FIXTURES]
+    if len(pending) < 2:
+        return
+
+    def prepare(name: str) -> None:
+        PREPARED_DB_FIXTURES[name] = setup_database(name, DB_CONFIGS[name], pytest_config)
+
+    helpers.run_concurrently(
+        [functools.partial(prepare, name) for name in pending],
+        pytest_config.getoption("--psqlgraph-threads"),
+    )
+
+
+def finish_databases(pytest_config: f.Config) -> None:
+    """Tears down the databases of the finished or unused session fixtures at once"""
+    fixtures = [*FINISHED_DB_FIXTURES, *PREPARED_DB_FIXTURES.values()]
+    FINISHED_DB_FIXTURES.clear()
+    PREPARED_DB_FIXTURES.clear()
+    helpers.run_concurrently(
+        [fixture.post_config for fixture in fixtures],
+        pytest_config.getoption("--psqlgraph-threads"),
+    )
+
+
+def shared_key(mark: models.PsqlgraphDataMark, item: p.Function) -> Tuple[str, str]:
+    """Module name, empty for session scoped data, and key of the data shared by a mark"""
+    module_id = item.module.__name__ if mark.get("scope") == "module" else ""
+    return module_id, helpers.mark_key(mark)
 
 
 def inject_marker_data(mark: models.PsqlgraphDataMark, item: p.Function) -> None:
@@ -115,80 +324,137 @@ def inject_marker_data(mark: models.PsqlgraphDataMark, item: p.Function) -> None
 
     """
     driver_name = mark["driver_name"]
+    scope = mark.get("scope", "function")
 
-    __get_or_make_driver_fixture__(driver_name, item._request)
-    if driver_name not in ACTIVE_DB_FIXTURES:
+    if driver_name not in DB_CONFIGS:
         raise ValueError(
             f"No driver '{driver_name}' defined in the fixture psqlgraph_config, "
-            f"expected one of {list(ACTIVE_DB_FIXTURES.keys())}"
+            f"expected one of {list(DB_CONFIGS.keys())}"
         )
-    fixture = ACTIVE_DB_FIXTURES[driver_name]
+    fixture = item._request.getfixturevalue(db_fixture_name(driver_name))
     handler = helpers.MarkHandler(mark, fixture)
     try:
         name = mark.get("name", "__psqlgraph_data__")
-        item.funcargs[name] = handler.pre()
-        item.addfinalizer(handler.post)
+        if scope == "function":
+            item._request.getfixturevalue(driver_name)
+            item.funcargs[name] = handler.pre()
+            item.addfinalizer(handler.post)
+        else:
+            # the driver fixture is set up later on, on top of the shared data
+            module_id, key = shared_key(mark, item)
+            item.funcargs[name] = fixture.load_shared(key, module_id or None, handler.pre)
     except Exception as e:
         logger.error(f"pytest-psqlgraph ran into an error while loading data: {e}", exc_info=True)
         raise e
 
 
 def pytest_runtest_setup(item: p.Function) -> None:
-
+    marks: List[models.PsqlgraphDataMark] = []
     for marker in item.iter_markers(name=MARKER_NAME):
         mark = cast(models.PsqlgraphDataMark, marker.kwargs)
-        data_dir = Path(
-            mark.get("data_dir")
-            or item.config.getoption("--data-dir")
-            or item.config.getini("psqlgraph-data-dir")
-            or ""
-        )
+        data_dir = mark_data_dir(mark, item.config)
 
         if not data_dir.exists():
             raise IOError(f"data file directory {data_dir} does not exist")
 
         mark["data_dir"] = str(data_dir.absolute())
-        inject_marker_data(mark, item)
+        marks.append(mark)
+
+    # tests using shared data only are isolated by their driver as well
+    mark_drivers = {mark["driver_name"] for mark in marks}
+    drivers = [n for n in DB_CONFIGS if n in mark_drivers or n in item.fixturenames]
+    prepare_databases(
+        [n for n in DB_CONFIGS if n in drivers or f"{n}_async" in item.fixturenames],
+        item.config,
+    )
 
+    # shared data left by other tests is rolled back, tests only see the data they asked for
+    shared: Dict[str, Set[Tuple[str, str]]] = defaultdict(set)
+    for mark in marks:
+        if mark.get("scope", "function") != "function":
+            shared[mark["driver_name"]].add(shared_key(mark, item))
+    for name, fixture in ACTIVE_DB_FIXTURES.items():
+        fixture.select_shared(shared[name])
+
+    # shared data must be loaded before any driver fixture is set up
+    for mark in marks:
+        if mark.get("scope", "function") != "function":
+            inject_marker_data(mark, item)
+
+    fixtures = [item._request.getfixturevalue(db_fixture_name(n)) for n in drivers]
+    helpers.run_concurrently(
+        [fixture.pre_test for fixture in fixtures if not fixture.in_test],
+        item.config.getoption("--psqlgraph-threads"),
+    )
+    for name in drivers:
+        item._request.getfixturevalue(name)
 
-def inject_driver_fixture(fixture: helpers.DatabaseFixture, request: f.SubRequest) -> None:
-    """Resolves and setups psqlgraph driver fixtures based on psqlgraph_config entries"""
+    for mark in marks:
+        if mark.get("scope", "function") == "function":
+            inject_marker_data(mark, item)
 
-    value = fixture.pre_test()
-    fd = f.FixtureDef(
-        argname=fixture.name,
-        baseid=None,
-        fixturemanager=request._fixturemanager,
-        func=lambda: value,
-        scope="function",
-        params=None,
-    )
-    fd.addfinalizer(fixture.post_test)
-    fd.cached_result = (value, 0, None)
 
-    old_fd = request._fixture_defs.get(fixture.name)  # noqa
-    add_fixturename = fixture.name not in request.fixturenames
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item: p.Function) -> Iterator[None]:
+    helpers.PROFILER.current = item.nodeid
+    yield
+    helpers.PROFILER.current = helpers.SESSION_KEY
 
-    def fin() -> None:
-        request._fixturemanager._arg2fixturedefs[fixture.name].remove(fd)  # noqa
-        request._fixture_defs[fixture.name] = old_fd  # noqa
 
-        if add_fixturename:
-            request._pyfuncitem._fixtureinfo.names_closure.remove(fixture.name)  # noqa
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_teardown(item: p.Function, nextitem: Optional[p.Function]) -> Iterator[None]:
+    yield
+    fixtures = list(TEST_DB_FIXTURES)
+    TEST_DB_FIXTURES.clear()
+    helpers.run_concurrently(
+        [fixture.finish_test for fixture in fixtures],
+        item.config.getoption("--psqlgraph-threads"),
+    )
+    for fixture in fixtures:
+        item.user_properties.append(
+            (f"psqlgraph_{fixture.name}_tables_cleaned", fixture.tables_cleaned)
+        )
+
+    # module scoped data is rolled back once the last test of the module is torn down
+    if getattr(nextitem, "module", None) is not getattr(item, "module", None):
+        for fixture in ACTIVE_DB_FIXTURES.values():
+            fixture.end_module()
+    if nextitem is None:
+        finish_databases(item.config)
+
 
-    request.addfinalizer(fin)
+@pytest.hookimpl(hookwrapper=True)
+def pytest_sessionfinish(session: m.Session) -> Iterator[None]:
+    yield
+    # session fixtures left over by an interrupted run are torn down with the session
+    finish_databases(session.config)
 
-    # inject fixture definition
-    request._fixturemanager._arg2fixturedefs.setdefault(fixture.name, []).insert(0, fd)  # noqa
-    # inject fixture value in request cache
-    request._fixture_defs[fixture.name] = fd  # noqa
-    if add_fixturename:
-        request._pyfuncitem._fixtureinfo.names_closure.append(fixture.name)  # noqa
 
+def pytest_terminal_summary(terminalreporter: Any, config: f.Config) -> None:
+    profiler = helpers.PROFILER
+    if not profiler.enabled:
+        return
 
-@pytest.fixture(autouse=True)
-def __pg_driver_fixture__(request: f.SubRequest) -> None:
-    """auto resolves named psqlgraph fixtures"""
+    path = config.getoption("--psqlgraph-profile-json")
+    if path:
+        with open(path, "w") as fp:
+            json.dump(profiler.report(), fp, indent=2)
+
+    terminalreporter.write_sep("=", "psqlgraph profile")
+    terminalreporter.write_line(f"{'phase':<24}{'calls':>8}{'total (s)':>12}")
+    phases = sorted(profiler.phases.items(), key=lambda p: p[1].total, reverse=True)
+    for phase, phase_stats in phases:
+        terminalreporter.write_line(
+            f"{phase:<24}{phase_stats.calls:>8}{phase_stats.total:>12.3f}"
+        )
 
-    for arg_name in ACTIVE_DB_FIXTURES:
-        __get_or_make_driver_fixture__(arg_name, request)
+    top = config.getoption("--psqlgraph-profile-top")
+    terminalreporter.write_line("")
+    terminalreporter.write_line(f"slowest {top} tests (fixture time, statements):")
+    items = sorted(
+        (i for i in profiler.items.items() if i[0] != helpers.SESSION_KEY),
+        key=lambda i: i[1].duration,
+        reverse=True,
+    )
+    for nodeid, stats in items[:top]:
+        terminalreporter.write_line(f"{stats.duration:>10.3f}s {stats.statements:>6} {nodeid}")
@@ -1,10 +1,13 @@
 import os
-from typing import Dict
+from typing import Any, Callable, Dict, Iterator, List
 
+import attr
+import psqlgraph
 import pytest
 from psqlgraph.base import VoidedBase
 
-from pytest_psqlgraph.models import DatabaseDriverConfig
+from pytest_psqlgraph import helpers, plugin
+from pytest_psqlgraph.models import DatabaseDriver, DatabaseDriverConfig
 from tests import models
 
 pytest_plugins = "pytester"
@@ -24,3 +27,31 @@ def psqlgraph_config() -> Dict[str, DatabaseDriverConfig]:
             extra_bases=[VoidedBase],
         )
     }
+
+
+@pytest.fixture
+def pg_driver_config(pg_driver: psqlgraph.PsqlGraphDriver) -> DatabaseDriverConfig:
+    """configuration of the active pg_driver, points to the worker database when using xdist"""
+    return plugin.ACTIVE_DB_FIXTURES["pg_driver"].driver.config
+
+
+@pytest.fixture
+def db_fixture_factory(
+    pg_driver_config: DatabaseDriverConfig,
+) -> Iterator[Callable[..., helpers.DatabaseFixture]]:
+    """Creates database fixtures from the pg_driver configuration with the given changes
+
+    The fixtures use the tables of pg_driver, they are closed at tear down without dropping them
+    """
+    fixtures: List[helpers.DatabaseFixture] = []
+
+    def create(name: str, **changes: Any) -> helpers.DatabaseFixture:
+        fixture = helpers.DatabaseFixture(
+            name, DatabaseDriver(attr.evolve(pg_driver_config, **changes))
+        )
+        fixtures.append(fixture)
+        return fixture
+
+    yield create
+    for fixture in fixtures:
+        fixture.close()
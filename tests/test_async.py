@@ -0,0 +1,58 @@
+from typing import Any, List
+
+import pkg_resources
+import psqlgml
+import pytest
+
+from tests import models
+
+aio = pytest.importorskip("pytest_psqlgraph.aio")
+pytest.importorskip("pytest_asyncio")
+
+here = pkg_resources.resource_filename("tests", "data")
+
+
+@pytest.mark.asyncio
+async def test_async_driver(pg_driver_async: Any) -> None:
+    assert isinstance(pg_driver_async, aio.AsyncDriver)
+    source_data = psqlgml.load_resource(here, "sample.yaml")
+    nodes = await pg_driver_async.load(source_data)
+    assert len(nodes) == 3
+
+    father = await pg_driver_async.pool.fetchrow(
+        "select * from node_father where node_id = 'father-1'"
+    )
+    assert father["_props"]["name"] == "Samson O."
+    table = models.HusbandWifeEdge.__tablename__
+    assert await pg_driver_async.pool.fetchval(f"select count(*) from {table}") == 1
+
+    assert await pg_driver_async.truncate_tables(["node_father"]) == 1
+    assert await pg_driver_async.pool.fetchval("select count(*) from node_father") == 0
+
+
+@pytest.mark.asyncio
+async def test_async_driver_isolation(pg_driver_async: Any) -> None:
+    assert await pg_driver_async.pool.fetchval("select count(*) from node_son") == 0
+
+
+@pytest.mark.psqlgraph_data(
+    name="pg_data",
+    driver_name="pg_driver",
+    data_dir=here,
+    resource="sample.yaml",
+    scope="module",
+)
+@pytest.mark.asyncio
+async def test_async_driver_shared_data(pg_driver_async: Any, pg_data: List[Any]) -> None:
+    assert len(pg_data) == 3
+    # the shared data is held by the transaction of the synchronous driver
+    assert await pg_driver_async.pool.fetchval("select count(*) from node_son") == 0
+    await pg_driver_async.pool.execute(
+        "insert into node_son (node_id, acl, _sysan, _props) "
+        "values ('son-async', '{}', '{}', '{}')"
+    )
+
+
+@pytest.mark.asyncio
+async def test_async_driver_shared_data_cleaned(pg_driver_async: Any) -> None:
+    assert await pg_driver_async.pool.fetchval("select count(*) from node_son") == 0
@@ -0,0 +1,65 @@
+from typing import List
+
+import pkg_resources
+import psqlgraph
+import pytest
+
+from pytest_psqlgraph import plugin
+
+here = pkg_resources.resource_filename("tests", "data")
+LOADED: List[List[psqlgraph.Node]] = []
+
+
+@pytest.mark.psqlgraph_data(
+    name="pg_data",
+    driver_name="pg_driver",
+    data_dir=here,
+    resource="sample.yaml",
+    scope="module",
+)
+@pytest.mark.parametrize("name", ["Samson", "Dana"])
+def test_module_scope(
+    pg_driver: psqlgraph.PsqlGraphDriver, pg_data: List[psqlgraph.Node], name: str
+) -> None:
+    LOADED.append(pg_data)
+    assert LOADED[0] is pg_data
+
+    with pg_driver.session_scope():
+        father = pg_driver.nodes().get("father-1")
+        # changes made by the previous test are rolled back
+        assert father.name == "Samson O."
+        father.name = name
+        pg_driver.node_insert(psqlgraph.Node.get_subclass("son")(node_id=f"son-{name}"))
+
+
+@pytest.mark.psqlgraph_data(
+    name="pg_data",
+    driver_name="pg_driver",
+    data_dir=here,
+    resource="sample.yaml",
+    scope="module",
+)
+def test_module_scope_loaded(
+    pg_driver: psqlgraph.PsqlGraphDriver, pg_data: List[psqlgraph.Node]
+) -> None:
+    assert len(pg_data) == 3
+    with pg_driver.session_scope():
+        assert pg_driver.nodes().count() == 3
+
+    fixture = plugin.ACTIVE_DB_FIXTURES["pg_driver"]
+    with pytest.raises(ValueError):
+        fixture.load_shared("late", None, list)
+
+
+@pytest.mark.psqlgraph_data(
+    name="pg_data",
+    driver_name="pg_driver",
+    data_dir=here,
+    resource="sample.yaml",
+    scope="session",
+)
+def test_session_scope(
+    pg_driver: psqlgraph.PsqlGraphDriver, pg_data: List[psqlgraph.Node]
+) -> None:
+    with pg_driver.session_scope():
+        assert pg_driver.nodes().count() == len(pg_data) == 3
@@ -1,8 +1,15 @@
+import functools
+import threading
 import uuid
+from typing import Callable, Dict, List
 
+import attr
 import psqlgraph
 import pytest
+import sqlalchemy
 
+from pytest_psqlgraph import helpers, plugin
+from pytest_psqlgraph.models import DatabaseDriver, DatabaseDriverConfig
 from tests import models
 
 
@@ -29,6 +36,13 @@ def nested_data_fixture(init_data, update_data) -> None:
     pass
 
 
+def test_shared_data_hidden(pg_driver: psqlgraph.PsqlGraphDriver) -> None:
+    """session scoped data of test_data_scope is only visible to the tests carrying its mark"""
+    assert not plugin.ACTIVE_DB_FIXTURES["pg_driver"].shared.active
+    with pg_driver.session_scope():
+        assert pg_driver.nodes().count() == 0
+
+
 @pytest.mark.parametrize("key, expectation", [(1, 1), (2, 2)])
 def test_fixtures_injected(
     pg_driver: psqlgraph.PsqlGraphDriver,
@@ -52,3 +66,254 @@ def test_query(pg_driver: psqlgraph.PsqlGraphDriver, dry_run: bool) -> None:
         assert 2 == len(x)
         mom = x[0]
         assert mom.name == "Hassler M. E."
+
+
+def test_rollback_isolation(
+    pg_driver: psqlgraph.PsqlGraphDriver,
+    db_fixture_factory: Callable[..., helpers.DatabaseFixture],
+) -> None:
+    fixture = db_fixture_factory("rollback_driver", isolation_mode="rollback")
+
+    g = fixture.pre_test()
+    with g.session_scope() as s:
+        s.add(models.Mother(node_id=str(uuid.uuid4()), name="Rolled B."))
+
+    with g.session_scope():
+        assert g.nodes(models.Mother).count() == 1
+    fixture.post_test()
+
+    with pg_driver.session_scope():
+        assert pg_driver.nodes(models.Mother).count() == 0
+
+
+def test_rollback_isolation_restarts_savepoint(
+    pg_driver: psqlgraph.PsqlGraphDriver,
+    db_fixture_factory: Callable[..., helpers.DatabaseFixture],
+) -> None:
+    fixture = db_fixture_factory("rollback_driver", isolation_mode="rollback")
+
+    g = fixture.pre_test()
+    for name in ["Failed A.", "Failed B."]:
+        with pytest.raises(ValueError):
+            with g.session_scope() as s:
+                s.add(models.Mother(node_id=str(uuid.uuid4()), name=name))
+                s.flush()
+                raise ValueError(name)
+
+    with g.session_scope() as s:
+        s.add(models.Mother(node_id=str(uuid.uuid4()), name="Rolled B."))
+    fixture.post_test()
+
+    with pg_driver.session_scope():
+        assert pg_driver.nodes(models.Mother).count() == 0
+
+
+def test_track_writes(
+    pg_driver: psqlgraph.PsqlGraphDriver,
+    db_fixture_factory: Callable[..., helpers.DatabaseFixture],
+) -> None:
+    fixture = db_fixture_factory("tracked_driver", track_writes=True)
+    fixture.pre_config()
+
+    g = fixture.pre_test()
+    with g.session_scope() as s:
+        s.add(models.Mother(node_id=str(uuid.uuid4()), name="Tracked M."))
+    fixture.post_test()
+
+    assert fixture.tables_cleaned == 1
+    with pg_driver.session_scope():
+        assert pg_driver.nodes(models.Mother).count() == 0
+
+    # read only tests do not clean anything
+    g = fixture.pre_test()
+    with g.session_scope():
+        assert g.nodes(models.Mother).count() == 0
+    fixture.post_test()
+    assert fixture.tables_cleaned == 0
+
+    # set up again, the tracker is reused
+    engine, tracker = fixture.driver.g.engine, fixture.tracker
+    fixture.pre_config()
+    assert fixture.tracker is tracker
+    assert helpers.WRITE_TRACKERS[engine].count(tracker) == 1
+
+    fixture.close()
+    assert tracker not in helpers.WRITE_TRACKERS.get(engine, [])
+    assert not sqlalchemy.event.contains(engine, "before_execute", tracker.receive_before_execute)
+
+
+@pytest.mark.parametrize(
+    "statement, table",
+    [
+        ("insert into node_father values ('a')", "node_father"),
+        ("INSERT INTO \"node_father\" values ('a')", "node_father"),
+        ('delete from "public"."node_father"', "public.node_father"),
+        ("update Public . Node_Father set acl = '{}'", "public.node_father"),
+        ('copy "Mixed ""Case"""(node_id) from stdin', '"Mixed ""Case"""'),
+        ("select * from node_father", None),
+    ],
+)
+def test_written_table(statement: str, table: str) -> None:
+    assert helpers.written_table(statement) == table
+
+
+def test_deferred_clean(
+    db_fixture_factory: Callable[..., helpers.DatabaseFixture], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    fixture = db_fixture_factory("deferred_driver", isolation_mode="truncate")
+
+    g = fixture.pre_test()
+    with g.session_scope() as s:
+        s.add(models.Mother(node_id=str(uuid.uuid4()), name="Deferred M."))
+    fixture.post_test(defer_clean=True)
+
+    assert fixture.dirty and not fixture.in_test
+    with g.session_scope():
+        assert g.nodes(models.Mother).count() == 1
+
+    # the deferred truncate is profiled as part of the post test phase
+    profiler = helpers.Profiler(enabled=True, current="test")
+    monkeypatch.setattr(helpers, "PROFILER", profiler)
+    fixture.finish_test()
+    assert not fixture.dirty
+    assert profiler.phases["post_test"].calls == profiler.phases["truncate"].calls == 1
+    with g.session_scope():
+        assert g.nodes(models.Mother).count() == 0
+
+
+def test_run_concurrently() -> None:
+    barrier = threading.Barrier(3, timeout=5)
+
+    def wait(i: int) -> int:
+        # only returns once all the calls are running
+        barrier.wait()
+        return i
+
+    assert helpers.run_concurrently([functools.partial(wait, i) for i in range(3)]) == [0, 1, 2]
+    assert helpers.run_concurrently([lambda: 1, lambda: 2], workers=1) == [1, 2]
+
+    def fail() -> None:
+        raise ValueError("setup failed")
+
+    for workers in [None, 1]:
+        done: List[int] = []
+        with pytest.raises(ValueError):
+            helpers.run_concurrently([fail, lambda: done.append(1)], workers=workers)
+        # the other calls are still run
+        assert done == [1]
+
+
+def test_table_cache(db_fixture_factory: Callable[..., helpers.DatabaseFixture]) -> None:
+    fixture = db_fixture_factory("cached_driver")
+
+    tables = fixture.tables
+    assert {"node_mother", "edge_fathersonedge", "_voided_nodes"} <= set(tables)
+    assert tables.index("edge_fathersonedge") < tables.index("node_father")
+    assert fixture.tables is tables
+
+
+def test_worker_database(
+    request: pytest.FixtureRequest, psqlgraph_config: Dict[str, DatabaseDriverConfig]
+) -> None:
+    if hasattr(request.config, "workerinput"):
+        pytest.skip("shares the template database with the running xdist workers")
+
+    worker = helpers.WorkerDatabase(psqlgraph_config["pg_driver"], "gw0", str(uuid.uuid4()))
+    worker.provision()
+
+    driver = DatabaseDriver(worker.config)
+    try:
+        assert "node_mother" in driver.g.engine.table_names()
+    finally:
+        driver.g.engine.dispose()
+    worker.destroy()
+
+    engine = sqlalchemy.create_engine(worker.base.url)
+    try:
+        names = {row[0] for row in engine.execute("select datname from pg_database")}
+    finally:
+        engine.dispose()
+    assert worker.database not in names
+    assert worker.template not in names
+
+
+def test_reuse_schema(db_fixture_factory: Callable[..., helpers.DatabaseFixture]) -> None:
+    fixture = db_fixture_factory("reused_driver", reuse_schema=True)
+    table_oid = "select 'node_mother'::regclass::oid"
+    try:
+        fixture.pre_config()
+        oid = fixture.driver.g.engine.scalar(table_oid)
+        fixture.post_config()
+
+        # same models, tables are kept as is
+        fixture.pre_config()
+        assert fixture.driver.g.engine.scalar(table_oid) == oid
+    finally:
+        fixture.driver.g.engine.execute(f"drop table {helpers.SCHEMA_MARKER_TABLE}")
+        fixture.driver.g.engine.dispose()
+
+
+def test_engine_options(pg_driver_config: DatabaseDriverConfig) -> None:
+    config = attr.evolve(
+        pg_driver_config,
+        engine_options=dict(pool_size=2, pool_pre_ping=True),
+        statement_timeout=1500,
+        warm_pool=2,
+    )
+    driver = DatabaseDriver(config)
+    assert DatabaseDriver(config).g.engine is driver.g.engine
+    assert DatabaseDriver(pg_driver_config).g.engine is not driver.g.engine
+
+    driver.warm_up()
+    assert driver.g.engine.pool.checkedin() == 2
+    with driver.g.engine.connect() as conn:
+        assert conn.execute("show statement_timeout").scalar() == "1500ms"
+    driver.g.engine.dispose()
+
+
+def test_unlogged(
+    pg_driver_config: DatabaseDriverConfig,
+    db_fixture_factory: Callable[..., helpers.DatabaseFixture],
+) -> None:
+    driver = db_fixture_factory("unlogged_driver", unlogged=True).driver
+    persistence = "select relpersistence from pg_class where oid = '{}'::regclass"
+    try:
+        helpers.create_tables(driver)
+        for table in ("node_mother", "edge_fathersonedge", "_voided_nodes"):
+            assert driver.g.engine.scalar(persistence.format(table)) == "u"
+        assert driver.g.engine.scalar("show synchronous_commit") == "off"
+    finally:
+        # referenced tables go first
+        for table in reversed(helpers.list_tables(driver)):
+            driver.g.engine.execute(f"alter table {table} set logged")
+        driver.g.engine.dispose()
+
+    assert helpers.schema_fingerprint(driver) != helpers.schema_fingerprint(
+        DatabaseDriver(pg_driver_config)
+    )
+
+
+def test_profiler(pg_driver_config: DatabaseDriverConfig) -> None:
+    profiler = helpers.Profiler(enabled=True, current="test")
+    engine = sqlalchemy.create_engine(pg_driver_config.url)
+    profiler.instrument(engine)
+    profiler.instrument(engine)
+
+    with profiler.timed("outer"), profiler.timed("inner"):
+        engine.execute("select 1")
+    engine.dispose()
+
+    assert profiler.phases["outer"].calls == profiler.phases["inner"].calls == 1
+    assert profiler.items["test"].duration == profiler.phases["outer"].total
+    assert profiler.items["test"].statements == 1
+    assert set(profiler.report()["phases"]) == {"outer", "inner"}
+
+
+def test_driver_fixtures(request: pytest.FixtureRequest) -> None:
+    fixture = request.getfixturevalue("__psqlgraph_pg_driver_db__")
+    assert fixture is plugin.ACTIVE_DB_FIXTURES["pg_driver"]
+    assert not fixture.in_test
+
+    # driver fixtures can be requested dynamically
+    assert request.getfixturevalue("pg_driver") is fixture.driver.g
+    assert fixture.in_test
@@ -1,10 +1,15 @@
-from typing import List
+from pathlib import Path
+from typing import Callable, List
 
 import pkg_resources
+import psqlgml
 import psqlgraph
 import pytest
+import sqlalchemy
 
-from pytest_psqlgraph.models import MarkExtension
+from pytest_psqlgraph import helpers, plugin
+from pytest_psqlgraph.models import MarkExtension, PsqlgraphDataMark
+from tests import models
 
 here = pkg_resources.resource_filename("tests", "data")
 
@@ -105,3 +110,368 @@ def test_with_fixture__no_inject(pg_driver: psqlgraph.PsqlGraphDriver) -> None:
         dana = pg_driver.nodes().get("dana-1")
 
         assert dana.name == "Dana D. O."
+
+
+def test_schema_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    dictionary = models.Dictionary()
+    cache = helpers.SchemaCache(location=str(tmp_path))
+
+    di, schema = cache.get(dictionary)
+    assert cache.get(dictionary) == (di, schema)
+    assert (tmp_path / helpers.dictionary_hash(dictionary)).exists()
+
+    # later sessions reuse the generated files
+    monkeypatch.setattr(psqlgml, "generate", None)
+    assert helpers.SchemaCache(location=str(tmp_path)).get(dictionary)[1] == schema
+
+
+def test_resource_cache(tmp_path: Path) -> None:
+    dictionary = models.Dictionary()
+    resource = tmp_path / "sample.yaml"
+    resource.write_text(Path(here, "sample.yaml").read_text())
+    cache = helpers.ResourceCache()
+
+    data, violations = cache.load(str(tmp_path), "sample.yaml", dictionary)
+    assert not violations
+    data["nodes"].clear()
+    assert len(cache.load(str(tmp_path), "sample.yaml", dictionary)[0]["nodes"]) == 3
+
+    # changes to the file invalidate the entry
+    resource.write_text(resource.read_text().replace("Samson O.", "Samson O. Jr."))
+    data, _ = cache.load(str(tmp_path), "sample.yaml", dictionary)
+    assert data["nodes"][0]["name"] == "Samson O. Jr."
+
+
+class DictStore(dict):
+    def set(self, key: str, value: object) -> None:
+        self[key] = value
+
+
+def test_validation_store(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    dictionary = models.Dictionary()
+    store = DictStore()
+    (tmp_path / "sample.yaml").write_text(Path(here, "sample.yaml").read_text())
+    (tmp_path / "invalid.yaml").write_text(
+        Path(here, "sample.yaml").read_text().replace("label: wife", "label: uncle")
+    )
+    _, violations = helpers.ResourceCache(store=store).load(
+        str(tmp_path), "invalid.yaml", dictionary
+    )
+    assert violations
+    helpers.ResourceCache(store=store).load(str(tmp_path), "sample.yaml", dictionary)
+    assert len(store) == 2
+
+    # unchanged files are not validated again, failures included
+    def collect_violations(req: psqlgml.ValidationRequest) -> None:
+        raise AssertionError(f"{req.data_file} validated again")
+
+    monkeypatch.setattr(helpers, "collect_violations", collect_violations)
+    cache = helpers.ResourceCache(store=store)
+    assert not cache.load(str(tmp_path), "sample.yaml", dictionary)[1]
+    capsys.readouterr()
+    assert cache.load(str(tmp_path), "invalid.yaml", dictionary)[1] == violations
+    # stored failures are reported through logging
+    assert not capsys.readouterr().out
+    assert "invalid.yaml" in caplog.text
+
+
+def test_preload_resources(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    dictionary = models.Dictionary()
+    (tmp_path / "sample.yaml").write_text(Path(here, "sample.yaml").read_text())
+    (tmp_path / "invalid.yaml").write_text(
+        Path(here, "sample.yaml").read_text().replace("label: wife", "label: uncle")
+    )
+    cache = helpers.ResourceCache()
+    resources = [(str(tmp_path), name, dictionary) for name in ("sample.yaml", "invalid.yaml")]
+    invalid = cache.preload(resources, processes=2)
+    assert list(invalid) == [str(tmp_path / "invalid.yaml")]
+
+    # preloaded resources are not validated again
+    def collect_violations(req: psqlgml.ValidationRequest) -> None:
+        raise AssertionError(f"{req.data_file} validated again")
+
+    monkeypatch.setattr(helpers, "collect_violations", collect_violations)
+    data, violations = cache.load(str(tmp_path), "sample.yaml", dictionary)
+    assert len(data["nodes"]) == 3 and not violations
+    assert cache.preload(resources, processes=2) == invalid
+
+
+def test_preload_unreadable(tmp_path: Path) -> None:
+    dictionary = models.Dictionary()
+    (tmp_path / "sample.yaml").write_text(Path(here, "sample.yaml").read_text())
+    (tmp_path / "broken.yaml").write_text("nodes: [")
+    cache = helpers.ResourceCache()
+    names = ("sample.yaml", "broken.yaml", "missing.yaml")
+    assert not cache.preload([(str(tmp_path), name, dictionary) for name in names])
+
+    # unreadable resources are left to the tests using them
+    assert not cache.load(str(tmp_path), "sample.yaml", dictionary)[1]
+    with pytest.raises(FileNotFoundError):
+        cache.load(str(tmp_path), "missing.yaml", dictionary)
+
+
+@pytest.mark.psqlgraph_data(
+    name="pg_data",
+    driver_name="pg_driver",
+    data_dir=here,
+    resource="sample.yaml",
+    extension=AppendExtension,
+    bulk=True,
+)
+def test_pgdata_bulk(pg_driver: psqlgraph.PsqlGraphDriver, pg_data: List[psqlgraph.Node]) -> None:
+    assert len(pg_data) == 3
+    with pg_driver.session_scope():
+        father = pg_driver.nodes().get("father-1")
+        assert father.name == "Mr. Samson O."
+        assert [son.node_id for son in father.sons] == ["son-1"]
+        assert father.wife[0].sons[0].node_id == "son-1"
+
+
+def test_mark_clean(pg_driver: psqlgraph.PsqlGraphDriver) -> None:
+    fixture = plugin.ACTIVE_DB_FIXTURES["pg_driver"]
+    handler = helpers.MarkHandler(PsqlgraphDataMark(resource=GRAPH), fixture)
+    handler.pre()
+
+    # the driver fixture truncates at tear down, no need to clean up twice
+    handler.post()
+    with pg_driver.session_scope():
+        assert pg_driver.nodes().count() == 2
+
+    handler.factory.clean()
+    with pg_driver.session_scope():
+        assert pg_driver.nodes().count() == 0
+        assert pg_driver.edges().count() == 0
+
+
+def test_graph_templates(pg_driver: psqlgraph.PsqlGraphDriver) -> None:
+    graph = dict(
+        unique_field="node_id",
+        nodes=[dict(label="father", node_id="father-x"), dict(label="son", node_id="son-x")],
+        edges=[dict(src="father-x", dst="son-x")],
+    )
+    handler = helpers.MarkHandler(
+        PsqlgraphDataMark(resource=graph, deterministic_seed=42),
+        plugin.ACTIVE_DB_FIXTURES["pg_driver"],
+    )
+    father, son = handler.factory.generate(graph)
+    assert [s.node_id for s in father.sons] == ["son-x"]
+
+    # later calls are created from the template, without mocking
+    handler.factory.factory = None
+    copies = handler.factory.generate(graph)
+    assert copies[0] is not father
+    assert copies[0].name == father.name
+    assert [s.node_id for s in copies[0].sons] == ["son-x"]
+
+    # seeded graphs are reproducible
+    helpers.GRAPH_TEMPLATES.clear()
+    assert handler.factory.generate(graph)[1].name == son.name
+
+
+@pytest.mark.parametrize("bulk", [True, False])
+def test_deferred_indexes(pg_driver: psqlgraph.PsqlGraphDriver, bulk: bool) -> None:
+    fixture = plugin.ACTIVE_DB_FIXTURES["pg_driver"]
+    mark = PsqlgraphDataMark(resource="sample.yaml", data_dir=here, bulk=bulk)
+    handler = helpers.MarkHandler(mark, fixture)
+    handler.factory.index_threshold = 3
+
+    statements: List[str] = []
+
+    def record(conn: object, cursor: object, statement: str, *_: object) -> None:
+        statements.append(statement.lower())
+
+    sqlalchemy.event.listen(pg_driver.engine, "before_cursor_execute", record)
+    try:
+        handler.pre()
+    finally:
+        sqlalchemy.event.remove(pg_driver.engine, "before_cursor_execute", record)
+
+    assert any(
+        s.startswith("set constraints") and "public.edge_fathersonedge_src_id_fkey" in s
+        for s in statements
+    )
+    assert not any("constraints all" in statement for statement in statements)
+    assert "drop index if exists node_father__props_idx" in statements
+    assert any(s.startswith("create index node_father__props_idx") for s in statements)
+    with pg_driver.session_scope():
+        assert [son.node_id for son in pg_driver.nodes().get("father-1").sons] == ["son-1"]
+        indexes = pg_driver.engine.execute(
+            "select indexname from pg_indexes where tablename = 'node_father'"
+        )
+        assert "node_father__props_idx" in {row[0] for row in indexes}
+
+
+def test_snapshot(pg_driver: psqlgraph.PsqlGraphDriver, monkeypatch: pytest.MonkeyPatch) -> None:
+    fixture = plugin.ACTIVE_DB_FIXTURES["pg_driver"]
+    mark = PsqlgraphDataMark(resource="sample.yaml", data_dir=here, snapshot=True)
+    handler = helpers.MarkHandler(mark, fixture)
+    loaded = handler.pre()
+    handler.factory.clean()
+
+    def from_source(*_: object) -> None:
+        raise AssertionError("snapshot not restored")
+
+    monkeypatch.setattr(helpers.DataFactory, "from_source", from_source)
+    restored = helpers.MarkHandler(mark, fixture).pre()
+    assert [n.node_id for n in restored] == [n.node_id for n in loaded]
+    with pg_driver.session_scope():
+        father = pg_driver.nodes().get("father-1")
+        assert father.name == "Samson O."
+        assert [son.node_id for son in father.sons] == ["son-1"]
+        assert pg_driver.edges().count() == 3
+
+
+def test_snapshot_extension(pg_driver: psqlgraph.PsqlGraphDriver) -> None:
+    fixture = plugin.ACTIVE_DB_FIXTURES["pg_driver"]
+    mark = PsqlgraphDataMark(
+        resource="sample.yaml", data_dir=here, snapshot=True, extension=AppendExtension
+    )
+    with pytest.raises(ValueError, match="AppendExtension"):
+        helpers.MarkHandler(mark, fixture).pre()
+
+
+def test_snapshot_track_writes(
+    db_fixture_factory: Callable[..., helpers.DatabaseFixture]
+) -> None:
+    fixture = db_fixture_factory("tracked_driver", isolation_mode="truncate", track_writes=True)
+    fixture.pre_config()
+    mark = PsqlgraphDataMark(resource="sample.yaml", data_dir=here, snapshot=True)
+
+    for _ in range(3):
+        g = fixture.pre_test()
+        assert len(helpers.MarkHandler(mark, fixture).pre()) == 3
+        fixture.post_test()
+        assert fixture.tables_cleaned == 6
+
+    with g.session_scope():
+        assert g.nodes().count() == 0
+
+
+@pytest.mark.psqlgraph_data(
+    name="pg_data",
+    driver_name="pg_driver",
+    data_dir=here,
+    resource="sample.ndjson",
+    extension=AppendExtension,
+)
+def test_pgdata_stream(pg_driver: psqlgraph.PsqlGraphDriver, pg_data: List[str]) -> None:
+    assert sorted(pg_data) == ["father-1", "mother-1", "son-1"]
+    with pg_driver.session_scope():
+        father = pg_driver.nodes().get("father-1")
+        assert father.name == "Mr. Samson O."
+        assert [son.node_id for son in father.sons] == ["son-1"]
+        assert father.wife[0].sons[0].node_id == "son-1"
+
+
+def test_stream_bulk(pg_driver: psqlgraph.PsqlGraphDriver) -> None:
+    fixture = plugin.ACTIVE_DB_FIXTURES["pg_driver"]
+    mark = PsqlgraphDataMark(resource="sample.yaml", data_dir=here, bulk=True, stream=True)
+    handler = helpers.MarkHandler(mark, fixture)
+    handler.factory.stream(helpers.StreamSource.open(here, "sample.yaml"), chunk_size=2)
+    with pg_driver.session_scope():
+        assert pg_driver.nodes().count() == 3
+        assert pg_driver.edges().count() == 3
+
+    handler.post()
+    handler.factory.clean()
+    with pg_driver.session_scope():
+        assert pg_driver.nodes().count() == 0
+
+
+SYNTHETIC = [dict(label="father", count=4), dict(label="son", parent="father", fanout=3)]
+
+
+@pytest.mark.psqlgraph_data(
+    name="pg_data", driver_name="pg_driver", synthetic=SYNTHETIC, deterministic_seed=7
+)
+def test_pgdata_synthetic(pg_driver: psqlgraph.PsqlGraphDriver, pg_data: List[str]) -> None:
+    assert len(pg_data) == 16
+    with pg_driver.session_scope():
+        fathers = pg_driver.nodes(models.Father).all()
+        assert len(fathers) == 4
+        assert [len(father.sons) for father in fathers] == [3, 3, 3, 3]
+        assert pg_driver.nodes(models.Son).count() == 12
+
+
+def test_synthetic_source() -> None:
+    source = helpers.SyntheticSource.create(SYNTHETIC, models, seed=7)
+    same = helpers.SyntheticSource.create(SYNTHETIC, models, seed=7)
+    assert list(source.nodes()) == list(same.nodes())
+    assert list(source.edges()) == list(same.edges())
+    assert list(source.nodes()) != list(helpers.SyntheticSource.create(SYNTHETIC, models).nodes())
+
+    # sons are linked through the father's association
+    edge = next(source.edges())
+    assert edge["src"] == source.node_id("father", 0)
+    assert edge["dst"] == source.node_id("son", 0)
+
+    orphans = helpers.SyntheticSource.create([dict(label="son", parent="father")], models)
+    with pytest.raises(ValueError):
+        list(orphans.nodes())
+
+
+def test_deferred_indexes_stream(pg_driver: psqlgraph.PsqlGraphDriver) -> None:
+    fixture = plugin.ACTIVE_DB_FIXTURES["pg_driver"]
+    handler = helpers.MarkHandler(PsqlgraphDataMark(synthetic=SYNTHETIC), fixture)
+    handler.factory.index_threshold = 10
+    source = helpers.SyntheticSource.create(SYNTHETIC, fixture.driver.model)
+
+    statements: List[str] = []
+
+    def record(conn: object, cursor: object, statement: str, *_: object) -> None:
+        statements.append(statement.lower())
+
+    sqlalchemy.event.listen(pg_driver.engine, "before_cursor_execute", record)
+    try:
+        # chunks are smaller than the threshold, the whole resource is not
+        assert len(handler.factory.stream(source, chunk_size=5)) == 16
+    finally:
+        sqlalchemy.event.remove(pg_driver.engine, "before_cursor_execute", record)
+
+    # checked once, when the whole resource is written
+    assert (
+        sum(s.startswith("set constraints") and s.endswith("immediate") for s in statements) == 1
+    )
+    assert "drop index if exists node_son__props_idx" in statements
+    with pg_driver.session_scope():
+        assert pg_driver.nodes(models.Son).count() == 12
+
+
+def test_deferred_indexes_rollback(
+    db_fixture_factory: Callable[..., helpers.DatabaseFixture]
+) -> None:
+    fixture = db_fixture_factory(
+        "rollback_driver", isolation_mode="rollback", deferred_index_threshold=3
+    )
+    g = fixture.pre_test()
+    helpers.MarkHandler(PsqlgraphDataMark(resource="sample.yaml", data_dir=here), fixture).pre()
+
+    # edge checks are deferred again for the rest of the test transaction
+    with g.session_scope() as s:
+        s.add(models.FatherSonEdge(src_id="father-x", dst_id="son-x"))
+        s.flush()
+        s.add(models.Father(node_id="father-x", name="Late F."))
+        s.add(models.Son(node_id="son-x", name="Late S."))
+    with g.session_scope():
+        assert [son.node_id for son in g.nodes().get("father-x").sons] == ["son-x"]
+        assert g.nodes().get("father-1").sons
+    fixture.post_test()
+
+
+def test_bulk_track_writes(db_fixture_factory: Callable[..., helpers.DatabaseFixture]) -> None:
+    fixture = db_fixture_factory("tracked_driver", isolation_mode="truncate", track_writes=True)
+    fixture.pre_config()
+
+    g = fixture.pre_test()
+    helpers.MarkHandler(PsqlgraphDataMark(synthetic=SYNTHETIC), fixture).pre()
+    fixture.post_test()
+
+    # rows inserted with the DBAPI cursor are tracked as well
+    assert fixture.tables_cleaned == 3
+    with g.session_scope():
+        assert g.nodes().count() == 0